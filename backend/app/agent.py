@@ -1,303 +1,586 @@
 ## This file serves as the Agent for marketing analysis using Google Gemini and SerpAPI
 ## It includes web search, prompt construction, response parsing, and insight generation.
-## While testing APIs especially Gemini 2.5-flash, this code prints detailed debug information to the console.
-## Kept for now to help with debugging and future enhancements.
+## Detailed debug dumps of raw Gemini responses are logged at DEBUG level only when
+## LOG_DEBUG_DUMPS is enabled (off by default in production).
 
 import asyncio
-import json
-import re
-from typing import List, Dict, Any
-import google.generativeai as genai
+import logging
+import time
+from contextlib import aclosing
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import httpx
 from .schemas import AnalyzeResponse, Insight, Source
 from .config import get_settings
+from .http_client import create_http_client
+from .cache import ResponseCache, SearchCache, cache_key
+from .semantic_cache import SemanticCache
+from .shared_state import SharedFlight, create_state_backend
+from .history import AnalysisStore
+from .pipeline import AnalysisState, CheckpointStore, Node, NodeTimeoutError, Pipeline
+from .singleflight import SingleFlight
+from .json_stream import InsightStreamParser, parse_insights_document
+from .admission import AdmissionController, OverloadedError
+from .metrics import ANALYZE_SECONDS, CANCELLED_UPSTREAM, FALLBACKS, LLM_TOKENS, UPSTREAM_ERRORS
+from .telemetry import span, start_timings
+from .research import expand_queries, merge_results
+from .resilience import ResilientCaller, is_retryable
+from .ratelimit import UpstreamLimiter, estimate_tokens, throttle
+from .context import ContextBuilder
+from .providers import Completion, LLMProvider, RateLimitedError, SearchProvider, create_llm_provider, create_search_provider
+
+
+logger = logging.getLogger(__name__)
 
 
 class MarketingAgent:
     """Marketing analysis agent using Google Gemini and SerpAPI"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        search_provider: Optional[SearchProvider] = None,
+        llm_provider: Optional[LLMProvider] = None
+    ):
         settings = get_settings()
         
-        # Configure Gemini
-        genai.configure(api_key=settings.google_api_key)
-        self.model = genai.GenerativeModel(settings.gemini_model)
+        # Shared pooled HTTP client; normally injected by the app lifespan
+        self.http_client = http_client
+        
+        # Upstream providers (SerpAPI + Gemini by default, mocks for load testing)
+        self.search_provider = search_provider or create_search_provider(settings, self.get_http_client)
+        self.llm_provider = llm_provider or create_llm_provider(settings)
+        
+        # Bound concurrent Gemini calls; excess requests queue briefly, then get rejected
+        self.llm_admission = AdmissionController(
+            "gemini",
+            max_concurrency=settings.llm_max_concurrency,
+            max_queue=settings.llm_max_queue,
+            queue_timeout=settings.llm_queue_timeout
+        )
+        
+        # Caches, single-flight and rate limits shared with other workers (None: this process only)
+        self.state = create_state_backend(settings)
+        
+        # Process-wide upstream rate limits, shared by interactive, batch and job traffic
+        self.search_limiter = UpstreamLimiter(
+            "serpapi",
+            rpm=settings.search_rpm,
+            daily_quota=settings.search_daily_quota,
+            shared=self.state
+        )
+        self.llm_limiter = UpstreamLimiter(
+            "gemini",
+            rpm=settings.llm_rpm,
+            tpm=settings.llm_tpm,
+            daily_quota=settings.llm_daily_quota,
+            shared=self.state
+        )
+        self.backoff_seconds = settings.upstream_backoff_seconds
+        
+        # Retries, hedging and circuit breakers around each provider
+        self.search_resilience = ResilientCaller.from_settings("serpapi", settings, hedge=settings.hedge_search)
+        self.llm_resilience = ResilientCaller.from_settings("gemini", settings, hedge=settings.hedge_llm)
+        
+        # Research stage fan-out (empty facets = single search of the raw prompt)
+        self.research_facets = settings.research_facets if settings.research_enabled else []
+        self.research_max_sources = settings.research_max_sources
+        self.research_snippet_similarity = settings.research_snippet_similarity
+        
+        # Token-budgeted prompt construction
+        self.context = ContextBuilder(
+            settings.llm_input_token_budget,
+            snippet_max_chars=settings.context_snippet_max_chars
+        )
+        
+        # Search-result cache
+        self.search_cache = SearchCache.from_settings(settings, self.state) if settings.search_cache_enabled else None
+        
+        # Response cache in front of run()
+        self.cache = ResponseCache.from_settings(settings, self.state) if settings.cache_enabled else None
+        
+        # Near-duplicate prompts: reuse a paraphrase's response or research results
+        self.semantic_cache = SemanticCache.from_settings(settings) if settings.semantic_cache_enabled else None
         
-        # SerpAPI
-        self.serpapi_key = settings.serpapi_api_key
+        # Every fresh analysis is kept for /history and /search
+        self.history = AnalysisStore.from_settings(settings) if settings.history_enabled else None
+        
+        # Identical concurrent run() calls share one in-flight analysis; across
+        # workers, the others wait for the shared cache entry of the one running it
+        self.flight = SingleFlight()
+        self.shared_flight = None
+        if self.state is not None and self.cache is not None:
+            self.shared_flight = SharedFlight(self.state, settings.state_flight_lock_ttl)
+        
+        # research -> analysis -> summary, each node with its own timeout and
+        # concurrency limit; when a node fails, research results and raw LLM
+        # output are checkpointed for the retry
+        checkpoints = CheckpointStore.from_settings(settings, self.state) if settings.pipeline_checkpoints_enabled else None
+        self.pipeline = (
+            Pipeline(checkpoints)
+            .add_node(Node(
+                "research", self.research_node, outputs=("search_results",),
+                timeout=settings.pipeline_research_timeout, concurrency=settings.pipeline_research_concurrency
+            ))
+            .add_node(Node(
+                "analysis", self.analysis_node, outputs=("raw_output", "usage"),
+                timeout=settings.pipeline_analysis_timeout, concurrency=settings.pipeline_analysis_concurrency
+            ))
+            .add_node(Node(
+                "summary", self.summary_node,
+                timeout=settings.pipeline_summary_timeout, concurrency=settings.pipeline_summary_concurrency
+            ))
+            .add_edge("research", "analysis")
+            .add_edge("analysis", "summary")
+        )
+        
+        # Raw response dumps are expensive; only when explicitly enabled
+        self.debug_dumps = settings.log_debug_dumps
+        
+        logger.info("Agent initialized with %s search and %s LLM", self.search_provider.name, self.llm_provider.name)
+    
+    def get_http_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating one if none was injected"""
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = create_http_client(get_settings())
+        return self.http_client
+    
+    async def aclose(self):
+        """Close providers and the shared HTTP client, releasing pooled connections"""
+        await self.search_provider.aclose()
+        await self.llm_provider.aclose()
+        if self.http_client is not None and not self.http_client.is_closed:
+            await self.http_client.aclose()
+        if self.cache is not None:
+            self.cache.close()
+        if self.history is not None:
+            await self.history.aclose()
+        if self.state is not None:
+            await self.state.aclose()
+    
+    async def research(self, prompt: str, num_results: int = 5) -> List[Dict[str, Any]]:
+        """Research the prompt, reusing the results of a near-duplicate prompt when one is cached"""
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.get_sources(prompt, num_results)
+            if cached is not None:
+                return cached
+        
+        try:
+            results = await self.research_uncached(prompt, num_results)
+        except asyncio.CancelledError:
+            # Cancelled before the analysis: its LLM call will never be made
+            CANCELLED_UPSTREAM.inc(self.llm_resilience.name, "skipped")
+            raise
+        if self.semantic_cache is not None:
+            self.semantic_cache.add_sources(prompt, num_results, results)
+        return results
+    
+    async def research_uncached(self, prompt: str, num_results: int = 5) -> List[Dict[str, Any]]:
+        """Search the prompt and its facet sub-queries concurrently; return merged, ranked results"""
+        if not self.research_facets:
+            with span("search"):
+                return await self.search_web(prompt, num_results)
+        
+        queries = expand_queries(prompt, self.research_facets)
+        with span("search"):
+            outcomes = await asyncio.gather(
+                *(self.search_web(query, num_results) for query in queries),
+                return_exceptions=True
+            )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
         
-        print(f"Agent initialized with {settings.gemini_model}")
+        with span("research_merge"):
+            merged = merge_results(
+                outcomes,
+                limit=max(num_results, self.research_max_sources),
+                snippet_similarity=self.research_snippet_similarity
+            )
+        logger.debug("Research: %d queries, %d merged sources", len(queries), len(merged))
+        return merged
     
     async def search_web(self, query: str, num_results: int = 5) -> List[Dict[str, Any]]:
-        """Search the web using SerpAPI"""
+        """Search the web through the search-result cache"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await asyncio.wait_for(
-                    client.get(
-                        "https://serpapi.com/search",
-                        params={
-                            "q": query,
-                            "api_key": self.serpapi_key,
-                            "num": num_results,
-                            "engine": "google"
-                        }
-                    ),
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    results = []
-                    
-                    for result in data.get("organic_results", [])[:num_results]:
-                        results.append({
-                            "title": result.get("title", ""),
-                            "url": result.get("link", ""),
-                            "snippet": result.get("snippet", "")
-                        })
-                    
-                    print(f"SerpAPI: Found {len(results)} results")
-                    return results
-                else:
-                    print(f"SerpAPI error: {response.status_code}")
-                    return []
+            if self.search_cache is None:
+                return await self.fetch_search_results(query, num_results)
+            
+            key = (query, num_results, self.search_provider.engine)
+            return await self.search_cache.get_or_fetch(
+                key, lambda: self.fetch_search_results(query, num_results)
+            )
+        except OverloadedError:
+            raise
         except Exception as e:
-            print(f"Search error: {e}")
+            UPSTREAM_ERRORS.inc("search")
+            logger.warning("Search error: %s", e)
             return []
     
-    def extract_json_from_text(self, text: str) -> str:
-        """Extract JSON from text that might have markdown or other formatting"""
-        # Remove markdown code blocks
-        text = re.sub(r'```json\s*', '', text)
-        text = re.sub(r'```\s*', '', text)
-        
-        # Try to find JSON object
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            return json_match.group(0)
-        
-        return text
+    async def fetch_search_results(self, query: str, num_results: int = 5) -> List[Dict[str, Any]]:
+        """Call the search provider (retried, hedged, behind the breaker); raises on upstream errors"""
+        return await self.search_resilience.call(lambda: self._search_once(query, num_results))
     
-    async def analyze_with_gemini(self, prompt: str, search_results: List[Dict]) -> Dict[str, Any]:
-        """Analyze with Gemini"""
-        
-        if not search_results:
-            context = "No search results available. Provide insights based on general marketing knowledge."
-        else:
-            context = "\n\n".join([
-                f"Source {i+1}: {r['title']}\n{r['snippet']}\nURL: {r['url']}"
-                for i, r in enumerate(search_results)
-            ])
-        
-        full_prompt = f"""You are an expert marketing analyst. Analyze this marketing query and provide actionable insights.
-
-Marketing Query: {prompt}
-
-Web Search Results:
-{context}
-
-INSTRUCTIONS:
-1. Generate 3-5 high-quality marketing insights
-2. Each insight must have: title, detail, confidence (0.7-0.95), category
-3. Categories can be: Strategy, Channels, Content, Analytics, Audience, ROI, Tools
-4. Use specific data from search results
-5. Make insights actionable
-
-CRITICAL: Return ONLY this JSON structure (no other text):
-{{
-    "insights": [
-        {{
-            "title": "Content Marketing Drives B2B Growth",
-            "detail": "Content marketing generates 3x more leads than traditional methods. Focus on long-form blog posts, whitepapers, and case studies to establish thought leadership.",
-            "confidence": 0.87,
-            "category": "Strategy"
-        }},
-        {{
-            "title": "LinkedIn Outperforms for Professional Engagement",
-            "detail": "LinkedIn delivers the highest B2B engagement rates at 2.8% compared to 0.5% on other platforms. Invest in LinkedIn Ads and organic content strategy.",
-            "confidence": 0.82,
-            "category": "Channels"
-        }}
-    ]
-}}
-
-Return ONLY the JSON object above with 3-5 insights. No explanation, no markdown formatting."""
-
+    async def _search_once(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        await throttle("search")
+        await self.search_limiter.acquire()
         try:
-            print("\n" + "="*60)
-            print("Calling Google Gemini...")
-            print("="*60)
-            
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(
-                    full_prompt,
-                    generation_config={
-                        "temperature": 0.7,
-                        "max_output_tokens": 2048,
+            return await self.search_provider.search(query, num_results)
+        except RateLimitedError as e:
+            self.search_limiter.backoff(e.retry_after or self.backoff_seconds)
+            raise
+    
+    async def acquire_llm(self, full_prompt: str):
+        """Wait for the scoped and process-wide LLM rate limits"""
+        await throttle("llm")
+        await self.llm_limiter.acquire(tokens=estimate_tokens(full_prompt))
+    
+    def parse_llm_output(self, text: str) -> Optional[Dict[str, Any]]:
+        """Parse the LLM response into {"insights": [...]}, recovering complete insights from truncated output"""
+        parsed, outcome = parse_insights_document(text)
+        if outcome == "recovered":
+            FALLBACKS.inc("json_recovered")
+            logger.warning("Recovered %d insights from a truncated or malformed LLM response", len(parsed["insights"]))
+        return parsed
+    
+    def build_prompt(self, prompt: str, search_results: List[Dict], usage: Optional[Dict[str, int]] = None) -> str:
+        """Build the Gemini prompt from the query and as many ranked search results as the token budget allows"""
+        full_prompt, report = self.context.build(prompt, search_results)
+        if usage is not None:
+            usage.update(report)
+        return full_prompt
+    
+    async def generate_text(self, full_prompt: str, usage: Optional[Dict[str, int]] = None) -> str:
+        """Call the LLM (retried, behind the breaker) and return the response text"""
+        with span("llm"):
+            completion = await self.llm_resilience.call(lambda: self._generate_once(full_prompt))
+        
+        # Prefer the provider's own token counts over the local estimate
+        prompt_tokens = completion.prompt_tokens or estimate_tokens(full_prompt)
+        completion_tokens = completion.completion_tokens or estimate_tokens(completion.text)
+        LLM_TOKENS.observe(prompt_tokens, "prompt")
+        LLM_TOKENS.observe(completion_tokens, "completion")
+        if usage is not None:
+            usage.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return completion.text
+    
+    async def _generate_once(self, full_prompt: str) -> Completion:
+        await self.acquire_llm(full_prompt)
+        async with self.llm_admission.slot():
+            try:
+                completion = await self.llm_provider.generate(full_prompt)
+            except RateLimitedError as e:
+                self.llm_limiter.backoff(e.retry_after or self.backoff_seconds)
+                raise
+        self.llm_limiter.charge(completion.completion_tokens or estimate_tokens(completion.text))
+        return completion
+    
+    async def research_node(self, state: AnalysisState) -> str:
+        """Pipeline node: search the prompt and its facets"""
+        state.search_results = await self.research(state.prompt, state.max_results)
+        logger.debug("Retrieved %d sources", len(state.search_results))
+        return f"Found {len(state.search_results)} sources"
+    
+    async def analysis_node(self, state: AnalysisState) -> str:
+        """Pipeline node: build the prompt and call the LLM; token counts go to state.usage"""
+        with span("prompt_build"):
+            full_prompt = self.build_prompt(state.prompt, state.search_results, state.usage)
+        
+        logger.debug("Calling LLM (%d prompt chars)", len(full_prompt))
+        state.raw_output = await self.generate_text(full_prompt, state.usage)
+        
+        if self.debug_dumps:
+            logger.debug("Raw LLM response (%d chars): %.500s", len(state.raw_output), state.raw_output)
+        return (
+            f"Analyzed {state.usage.get('sources_used', len(state.search_results))} sources"
+            f" ({state.usage.get('completion_tokens', 0)} completion tokens)"
+        )
+    
+    async def summary_node(self, state: AnalysisState) -> str:
+        """Pipeline node: parse the LLM output into validated insights and format the sources"""
+        with span("json_extract"):
+            parsed = self.parse_llm_output(state.raw_output or "")
+        
+        if parsed is None:
+            # Nothing usable came back: create fallback insights
+            logger.warning("Unparseable LLM response (%d chars): %.200r", len(state.raw_output or ""), state.raw_output)
+            FALLBACKS.inc("json_parse")
+            parsed = {
+                "insights": [
+                    {
+                        "title": "Manual Fallback Insight 1",
+                        "detail": "This is a fallback insight because Gemini response couldn't be parsed. The search found relevant sources about: " + state.prompt,
+                        "confidence": 0.6,
+                        "category": "General"
+                    },
+                    {
+                        "title": "Manual Fallback Insight 2", 
+                        "detail": "Based on the search results, consider researching this topic further with the sources provided.",
+                        "confidence": 0.5,
+                        "category": "General"
                     }
-                )
-            )
-            
-            raw_content = response.text
-            
-            print(f"\n RAW GEMINI RESPONSE ({len(raw_content)} chars):")
-            print("-" * 60)
-            print(raw_content[:500])  # Print first 500 chars
-            print("-" * 60)
-            
-            # Clean the response
-            cleaned_content = self.extract_json_from_text(raw_content)
+                ]
+            }
+        elif self.debug_dumps and parsed["insights"]:
+            logger.debug("First insight: %s", parsed["insights"][0])
+        
+        with span("validation"):
+            raw_insights = parsed.get("insights", [])
+            if not raw_insights:
+                logger.warning("No insights received from the LLM")
             
-            print(f"\n CLEANED RESPONSE ({len(cleaned_content)} chars):")
-            print("-" * 60)
-            print(cleaned_content[:500])
-            print("-" * 60)
+            state.insights = []
+            for idx, data in enumerate(raw_insights[:state.max_results]):
+                insight = self.to_insight(idx, data)
+                if insight is not None:
+                    state.insights.append(insight)
             
-            # Try to parse JSON
+            state.sources = self.to_sources(state.search_results, state.max_results)
+        return f"Kept {len(state.insights)} of {len(raw_insights)} insights"
+    
+    async def run(self, prompt: str, max_results: int = 5, use_cache: bool = True) -> AnalyzeResponse:
+        """Execute analysis, serving repeated prompts from the response cache.
+        
+        Concurrent calls for the same normalized prompt are coalesced into
+        one analysis; a caller that is cancelled only stops waiting for it.
+        """
+        key = cache_key(prompt, max_results)
+        
+        if use_cache:
+            cached = await self.cached_response(key, prompt, max_results)
+            if cached is not None:
+                return cached
+        elif self.cache is not None:
+            self.cache.bypassed += 1
+        
+        # no_cache callers only share a run with each other: a cached caller's run may be a shared-flight follower
+        return await self.flight.do((key, use_cache), lambda: self._run_and_cache(key, prompt, max_results, use_cache))
+    
+    async def _run_and_cache(self, key: str, prompt: str, max_results: int, use_cache: bool = True) -> AnalyzeResponse:
+        # A follower returns whatever the shared cache holds, which no_cache must not see
+        if self.shared_flight is not None and use_cache:
+            return await self.shared_flight.do(
+                key,
+                lambda: self._run_and_store(key, prompt, max_results),
+                lambda: self.cache.get_shared(key)
+            )
+        return await self._run_and_store(key, prompt, max_results)
+    
+    async def _run_and_store(self, key: str, prompt: str, max_results: int) -> AnalyzeResponse:
+        result = await self.run_uncached(prompt, max_results)
+        await self.store_response(key, prompt, max_results, result)
+        return result
+    
+    async def cached_response(self, key: str, prompt: str, max_results: int) -> Optional[AnalyzeResponse]:
+        """Exact-key cache hit, else a semantic hit for a paraphrased prompt, else None"""
+        start = time.perf_counter()
+        similarity = None
+        cached = await self.cache.get(key) if self.cache is not None else None
+        if cached is None and self.semantic_cache is not None:
+            hit = self.semantic_cache.get_response(prompt, max_results)
+            if hit is not None:
+                cached, similarity = hit
+                similarity = round(similarity, 3)
+        if cached is None:
+            return None
+        elapsed = time.perf_counter() - start
+        return cached.model_copy(update={
+            "cached": True,
+            "cache_similarity": similarity,
+            "processing_time": round(elapsed, 2),
+            "timings": {"cache_lookup": round(elapsed * 1000, 3)}
+        })
+    
+    async def store_response(self, key: str, prompt: str, max_results: int, result: AnalyzeResponse):
+        """Cache a finished analysis under its exact key and for semantic lookups, and record it"""
+        # Only keep real analyses, never the empty error response
+        if not result.insights:
+            return
+        if self.history is not None:
+            self.history.record(prompt, max_results, result)
+        if self.cache is not None:
+            await self.cache.set(key, result)
+        if self.semantic_cache is not None:
+            self.semantic_cache.add_response(prompt, max_results, result)
+    
+    def to_insight(self, idx: int, data: Dict[str, Any]) -> Optional[Insight]:
+        """Validate one raw insight dict into an Insight, or None if unusable"""
+        try:
+            return Insight(
+                title=str(data.get("title", f"Insight {idx + 1}"))[:200],
+                detail=str(data.get("detail", "No detail provided"))[:5000],
+                confidence=min(max(float(data.get("confidence", 0.5)), 0.0), 1.0),
+                category=str(data.get("category", "General"))[:50]
+            )
+        except Exception as e:
+            logger.warning("Skipping invalid insight %d: %s", idx + 1, e)
+            return None
+    
+    def to_sources(self, sources_data: List[Dict[str, Any]], max_results: int) -> List[Source]:
+        """Validate raw search results into Source objects"""
+        sources = []
+        for idx, data in enumerate(sources_data[:max_results]):
             try:
-                parsed = json.loads(cleaned_content)
-                print(f"\n JSON PARSED SUCCESSFULLY")
-                print(f"Keys in response: {list(parsed.keys())}")
-                
-                if "insights" in parsed:
-                    insights = parsed["insights"]
-                    print(f" Found 'insights' key with {len(insights)} items")
-                    
-                    if len(insights) > 0:
-                        print(f"\n First Insight:")
-                        print(json.dumps(insights[0], indent=2))
-                    else:
-                        print("Insights array is EMPTY!")
-                else:
-                    print("No 'insights' key in response!")
-                    print(f"Available keys: {list(parsed.keys())}")
-                
-                return parsed
-                
-            except json.JSONDecodeError as e:
-                print(f"\n JSON PARSE ERROR: {e}")
-                print(f"Error at position: {e.pos}")
-                print(f"Problem area: {cleaned_content[max(0, e.pos-50):e.pos+50]}")
-                
-                # Try to manually construct valid JSON
-                print("\n Attempting manual JSON construction...")
-                
-                # Create fallback insights
-                return {
-                    "insights": [
-                        {
-                            "title": "Manual Fallback Insight 1",
-                            "detail": "This is a fallback insight because Gemini response couldn't be parsed. The search found relevant sources about: " + prompt,
-                            "confidence": 0.6,
-                            "category": "General"
-                        },
-                        {
-                            "title": "Manual Fallback Insight 2", 
-                            "detail": "Based on the search results, consider researching this topic further with the sources provided.",
-                            "confidence": 0.5,
-                            "category": "General"
-                        }
-                    ]
-                }
-            
+                sources.append(Source(
+                    title=data.get("title", "Source"),
+                    url=data.get("url", ""),
+                    snippet=data.get("snippet", "")[:200]
+                ))
+            except Exception as e:
+                logger.warning("Skipping invalid source %d: %s", idx + 1, e)
+        return sources
+    
+    async def stream_gemini_insights(
+        self,
+        full_prompt: str,
+        usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream Gemini output and yield each insight dict as soon as it is complete"""
+        parser = InsightStreamParser()
+        breaker = self.llm_resilience.breaker
+        completion_chars = 0
+        responded = False
+        
+        # Output already sent can't be taken back, so streams are not retried or hedged
+        try:
+            breaker.check()
+            await self.acquire_llm(full_prompt)
+            async with self.llm_admission.slot():
+                async for chunk in self.llm_provider.stream(full_prompt):
+                    if not responded:
+                        responded = True
+                        breaker.record_success()
+                    completion_chars += len(chunk)
+                    for data in parser.feed(chunk):
+                        yield data
+        except asyncio.CancelledError:
+            CANCELLED_UPSTREAM.inc(self.llm_resilience.name, "in_flight")
+            raise
+        except OverloadedError:
+            raise
+        except RateLimitedError as e:
+            self.llm_limiter.backoff(e.retry_after or self.backoff_seconds)
+            UPSTREAM_ERRORS.inc("llm")
+            logger.error("LLM stream rate limited: %s", e)
+        except Exception as e:
+            if not responded and is_retryable(e):
+                responded = True
+                breaker.record_failure()
+            UPSTREAM_ERRORS.inc("llm")
+            logger.error("LLM stream error: %s", e, exc_info=True)
+        finally:
+            if not responded:
+                breaker.release()
+            completion_tokens = completion_chars // 4
+            self.llm_limiter.charge(completion_tokens)
+            if responded:
+                LLM_TOKENS.observe(estimate_tokens(full_prompt), "prompt")
+                LLM_TOKENS.observe(completion_tokens, "completion")
+            if usage is not None:
+                usage["completion_tokens"] = completion_tokens
+    
+    async def stream(self, prompt: str, max_results: int = 5, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+        """Execute analysis incrementally.
+        
+        Yields ("sources", List[Source]) once search returns, then
+        ("insight", Insight) per parsed insight, then ("done", AnalyzeResponse).
+        """
+        start = time.perf_counter()
+        timings = start_timings()
+        key = cache_key(prompt, max_results)
+        
+        if use_cache:
+            cached = await self.cached_response(key, prompt, max_results)
+            if cached is not None:
+                yield "sources", cached.sources
+                for insight in cached.insights:
+                    yield "insight", insight
+                yield "done", cached
+                return
+        elif self.cache is not None:
+            self.cache.bypassed += 1
+        
+        # Same nodes and trace as run_uncached; analysis streams, so it is timed here
+        state = AnalysisState(key, prompt, max_results)
+        await self.pipeline.run_node("research", state)
+        state.sources = self.to_sources(state.search_results, max_results)
+        yield "sources", state.sources
+        
+        step = time.perf_counter()
+        with span("prompt_build", timings):
+            full_prompt = self.build_prompt(prompt, state.search_results, state.usage)
+        
+        # Includes time the consumer spends sending each event to the client
+        try:
+            with span("llm_stream", timings):
+                # aclosing: stopping early must release the admission slot now, not at GC
+                async with aclosing(self.stream_gemini_insights(full_prompt, state.usage)) as parsed:
+                    async for data in parsed:
+                        insight = self.to_insight(len(state.insights), data)
+                        if insight is None:
+                            continue
+                        state.insights.append(insight)
+                        yield "insight", insight
+                        if len(state.insights) >= max_results:
+                            break
         except Exception as e:
-            print(f"\n GEMINI ERROR: {e}")
-            import traceback
-            print("\nFull traceback:")
-            traceback.print_exc()
-            return {"insights": []}
+            self.pipeline.record("analysis", state, step, "failed", str(e) or type(e).__name__)
+            raise
+        self.pipeline.record(
+            "analysis", state, step, "ok",
+            f"Streamed {len(state.insights)} insights ({state.usage.get('completion_tokens', 0)} completion tokens)"
+        )
+        
+        # Insights were validated as they streamed; summary only assembles the response
+        self.pipeline.record("summary", state, time.perf_counter(), "ok", f"Kept {len(state.insights)} insights")
+        result = AnalyzeResponse(
+            insights=state.insights,
+            sources=state.sources,
+            total_insights=len(state.insights),
+            processing_time=round(time.perf_counter() - start, 2),
+            timings=timings,
+            usage=state.usage,
+            thought_trace=state.trace
+        )
+        await self.store_response(key, prompt, max_results, result)
+        yield "done", result
     
-    async def run(self, prompt: str, max_results: int = 5) -> AnalyzeResponse:
-        """Execute analysis"""
-        import time
-        start = time.time()
+    async def run_uncached(self, prompt: str, max_results: int = 5) -> AnalyzeResponse:
+        """Execute analysis through the research -> analysis -> summary pipeline"""
+        start = time.perf_counter()
+        timings = start_timings()
+        state = AnalysisState(cache_key(prompt, max_results), prompt, max_results)
         
-        print("\n" + "="*60)
-        print(f"Starting Analysis")
-        print(f"Query: {prompt}")
-        print(f"Max Results: {max_results}")
-        print("="*60)
+        logger.info("Starting analysis (max_results=%d)", max_results)
         
         try:
-            # Step 1: Search
-            print("\n Step 1: Web Search")
-            sources_data = await self.search_web(prompt, max_results)
-            print(f"✓ Retrieved {len(sources_data)} sources")
-            
-            # Step 2: Analyze
-            print("\n Step 2: Gemini Analysis")
-            analysis = await self.analyze_with_gemini(prompt, sources_data)
-            
-            # Step 3: Format insights
-            print("\n Step 3: Formatting Insights")
-            insights = []
-            
-            raw_insights = analysis.get("insights", [])
-            print(f"Raw insights from Gemini: {len(raw_insights)}")
-            
-            if not raw_insights:
-                print("WARNING: No insights received from Gemini!")
-            
-            for idx, data in enumerate(raw_insights[:max_results]):
-                try:
-                    print(f"\nProcessing insight {idx + 1}:")
-                    print(f"  Title: {data.get('title', 'N/A')}")
-                    print(f"  Confidence: {data.get('confidence', 'N/A')}")
-                    print(f"  Category: {data.get('category', 'N/A')}")
-                    
-                    insight = Insight(
-                        title=str(data.get("title", f"Insight {idx + 1}"))[:200],
-                        detail=str(data.get("detail", "No detail provided"))[:5000],
-                        confidence=min(max(float(data.get("confidence", 0.5)), 0.0), 1.0),
-                        category=str(data.get("category", "General"))[:50]
-                    )
-                    insights.append(insight)
-                    print(f"  Successfully created insight object")
-                    
-                except Exception as e:
-                    print(f"  Error creating insight: {e}")
-                    print(f"  Data was: {data}")
-            
-            # Step 4: Format sources
-            print(f"\n Step 4: Formatting Sources")
-            sources = []
-            for idx, data in enumerate(sources_data[:max_results]):
-                try:
-                    sources.append(Source(
-                        title=data.get("title", "Source"),
-                        url=data.get("url", ""),
-                        snippet=data.get("snippet", "")[:200]
-                    ))
-                    print(f"Source {idx + 1}: {data.get('title', 'N/A')[:50]}")
-                except Exception as e:
-                    print(f"Error: {e}")
-            
-            elapsed = time.time() - start
-            
-            print("\n" + "="*60)
-            print(" ANALYSIS COMPLETE")
-            print(f"   Insights Generated: {len(insights)}")
-            print(f"   Sources Found: {len(sources)}")
-            print(f"   Processing Time: {elapsed:.2f}s")
-            print("="*60 + "\n")
-            
-            return AnalyzeResponse(
-                insights=insights,
-                sources=sources,
-                total_insights=len(insights),
-                processing_time=round(elapsed, 2)
-            )
-            
+            await self.pipeline.run(state)
+        except (OverloadedError, NodeTimeoutError):
+            # A timeout is an error for the caller, not an empty analysis
+            raise
         except Exception as e:
-            print(f"\n FATAL ERROR: {e}")
-            import traceback
-            traceback.print_exc()
-            
-            return AnalyzeResponse(
-                insights=[],
-                sources=[],
-                total_insights=0,
-                processing_time=0.0
-            )
\ No newline at end of file
+            # Completed nodes stay checkpointed, so a retry resumes after them
+            failed = state.trace[-1].node if state.trace else "pipeline"
+            if failed == "analysis":
+                UPSTREAM_ERRORS.inc("llm")
+                FALLBACKS.inc("llm_error")
+            logger.error("Analysis failed in %s: %s", failed, e, exc_info=True)
+            state.insights = []
+            state.sources = self.to_sources(state.search_results, max_results)
+        
+        elapsed = time.perf_counter() - start
+        ANALYZE_SECONDS.observe(elapsed)
+        
+        logger.info(
+            "Analysis complete: %d insights, %d sources in %.2fs",
+            len(state.insights), len(state.sources), elapsed
+        )
+        
+        return AnalyzeResponse(
+            insights=state.insights,
+            sources=state.sources,
+            total_insights=len(state.insights),
+            processing_time=round(elapsed, 2),
+            timings=timings,
+            usage=state.usage,
+            thought_trace=state.trace
+        )
@@ -0,0 +1,109 @@
+# backend/app/batch.py
+## Batch analysis: fan a list of AnalyzeRequests out over MarketingAgent.run
+## with a concurrency cap and batch-scoped SerpAPI/Gemini rate limits.
+## Identical prompts inside a batch run once; one item failing never fails
+## the rest of the batch.
+
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Tuple
+
+from .agent import MarketingAgent
+from .cache import cache_key
+from .config import Settings
+from .ratelimit import BATCH, TokenBucket, priority, scoped_limits
+from .resilience import request_deadline
+from .schemas import AnalyzeRequest, BatchItemResult
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRunner:
+    """Runs batches against one agent; rate limits are shared by all batches"""
+
+    def __init__(self, agent: MarketingAgent, settings: Settings):
+        self.agent = agent
+        self.max_concurrency = settings.batch_concurrency
+        self.item_timeout = settings.request_timeout
+        # One analysis makes a search per research query
+        self.search_bucket = TokenBucket(settings.batch_search_rpm * (1 + len(agent.research_facets)))
+        self.llm_bucket = TokenBucket(settings.batch_llm_rpm)
+        self.batches = 0
+        self.items = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    @staticmethod
+    def _dedupe_key(item: AnalyzeRequest) -> Tuple[str, bool]:
+        return cache_key(item.prompt, item.max_results), item.no_cache
+
+    async def _run_one(self, item: AnalyzeRequest, semaphore: asyncio.Semaphore) -> BatchItemResult:
+        async with semaphore:
+            try:
+                with request_deadline(self.item_timeout):
+                    result = await asyncio.wait_for(
+                        self.agent.run(item.prompt, max_results=item.max_results, use_cache=not item.no_cache),
+                        timeout=self.item_timeout
+                    )
+                if not item.include_timings:
+                    result = result.model_copy(update={"timings": None})
+                return BatchItemResult(index=-1, status="ok", result=result)
+            except asyncio.TimeoutError as e:
+                return BatchItemResult(index=-1, status="error", error=str(e) or f"Timeout after {self.item_timeout}s")
+            except Exception as e:
+                logger.warning("Batch item failed: %s", e)
+                return BatchItemResult(index=-1, status="error", error=str(e))
+
+    async def run(self, items: List[AnalyzeRequest], concurrency: int) -> AsyncIterator[BatchItemResult]:
+        """Yield one result per input item, in completion order"""
+        self.batches += 1
+        self.items += len(items)
+
+        groups: Dict[Tuple[str, bool], List[int]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault(self._dedupe_key(item), []).append(index)
+        self.deduplicated += len(items) - len(groups)
+
+        semaphore = asyncio.Semaphore(max(1, min(concurrency, self.max_concurrency)))
+        with scoped_limits(search=self.search_bucket, llm=self.llm_bucket), priority(BATCH):
+            tasks = {
+                asyncio.ensure_future(self._run_one(items[indices[0]], semaphore)): indices
+                for indices in groups.values()
+            }
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    outcome = task.result()
+                    if outcome.status != "ok":
+                        self.failed += len(tasks[task])
+                    for index in tasks[task]:
+                        yield outcome.model_copy(update={"index": index})
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "search_rate_limit": self.search_bucket.stats(),
+            "llm_rate_limit": self.llm_bucket.stats(),
+        }
+
+
+async def collect_ordered(results: AsyncIterator[BatchItemResult], total: int) -> Tuple[List[BatchItemResult], float]:
+    """Gather streamed results back into input order"""
+    start = time.perf_counter()
+    ordered: List[BatchItemResult] = [None] * total  # type: ignore[list-item]
+    # aclosing: if we're cancelled, the batch's item tasks are cancelled now, not at GC
+    async with aclosing(results):
+        async for outcome in results:
+            ordered[outcome.index] = outcome
+    return ordered, time.perf_counter() - start
@@ -0,0 +1,373 @@
+# backend/app/cache.py
+## Two-tier response cache for /analyze.
+## Tier one is an in-process LRU with TTL; tier two is an optional SQLite
+## file so cached analyses survive restarts. Keys are a normalized prompt
+## plus max_results, so trivially different spellings share an entry.
+## SearchCache sits under search_web and caches raw SerpAPI results.
+## In multi-worker mode both also read and write a tier in the shared
+## state backend, so one worker's results serve all of them.
+
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from .config import Settings
+from .schemas import AnalyzeResponse
+from .singleflight import SingleFlight, detached
+from .metrics import CACHE_REQUESTS
+from .shared_state import StateBackend, StateBackendError
+
+
+logger = logging.getLogger(__name__)
+
+
+_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, punctuation and whitespace so equivalent prompts match"""
+    text = _PUNCTUATION.sub(" ", prompt.casefold())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(prompt: str, max_results: int) -> str:
+    """Cache key for an analysis request"""
+    return f"{max_results}:{normalize_prompt(prompt)}"
+
+
+class LRUCache:
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache:
+    """Persistent key/value tier backed by a single SQLite table.
+
+    Calls are blocking; ResponseCache runs them in a worker thread. Every
+    `prune_every` writes, expired rows are deleted and rows beyond max_rows
+    are pruned soonest-expiring first.
+    """
+
+    def __init__(self, path: str, ttl: float, max_rows: int = 100000, prune_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune()
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete expired rows and rows beyond max_rows; returns how many went"""
+        with self._lock:
+            removed = self._prune()
+            self._conn.commit()
+            return removed
+
+    def _prune(self) -> int:
+        removed = self._conn.execute(
+            "DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+        removed += self._conn.execute(
+            "DELETE FROM response_cache WHERE key NOT IN "
+            "(SELECT key FROM response_cache ORDER BY expires_at DESC LIMIT ?)",
+            (self.max_rows,)
+        ).rowcount
+        self.pruned += removed
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "pruned": self.pruned}
+
+
+class ResponseCache:
+    """LRU tier in front of optional shared and SQLite tiers for AnalyzeResponse objects"""
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None, shared: Optional[StateBackend] = None):
+        self.memory = memory
+        self.disk = disk
+        self.shared = shared
+        self.bypassed = 0
+        self.shared_hits = 0
+        self.saved_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: Settings, shared: Optional[StateBackend] = None) -> "ResponseCache":
+        memory = LRUCache(settings.cache_max_entries, settings.cache_ttl)
+        disk = None
+        if settings.cache_sqlite_path:
+            disk = SQLiteCache(settings.cache_sqlite_path, settings.cache_ttl, settings.cache_sqlite_max_rows)
+        return cls(memory, disk, shared)
+
+    async def get_shared(self, key: str) -> Optional[AnalyzeResponse]:
+        """Look up only the tier shared with other workers; no metrics, so it can be polled"""
+        if self.shared is None:
+            return None
+        try:
+            raw = await self.shared.get(f"response:{key}")
+        except StateBackendError as e:
+            logger.warning("Shared response cache unavailable: %s", e)
+            return None
+        return AnalyzeResponse.model_validate_json(raw) if raw is not None else None
+
+    async def get(self, key: str) -> Optional[AnalyzeResponse]:
+        response = self.memory.get(key)
+        if response is None and self.shared is not None:
+            response = await self.get_shared(key)
+            if response is not None:
+                self.shared_hits += 1
+                self.memory.set(key, response)
+        if response is None and self.disk is not None:
+            raw = await asyncio.to_thread(self.disk.get, key)
+            if raw is not None:
+                response = AnalyzeResponse.model_validate_json(raw)
+                self.memory.set(key, response)
+
+        if response is not None:
+            self.saved_seconds += response.processing_time
+        CACHE_REQUESTS.inc("response", "hit" if response is not None else "miss")
+        return response
+
+    async def set(self, key: str, response: AnalyzeResponse):
+        self.memory.set(key, response)
+        if self.shared is not None:
+            try:
+                await self.shared.set(f"response:{key}", response.model_dump_json(), self.memory.ttl)
+            except StateBackendError as e:
+                logger.warning("Shared response cache unavailable: %s", e)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, response.model_dump_json())
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+            "shared_hits": self.shared_hits,
+            "bypassed": self.bypassed,
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
+
+
+class SearchCache:
+    """Search-result cache with stale-while-revalidate and coalesced fetches.
+
+    Entries younger than `ttl` are fresh. Entries up to `stale_ttl` past
+    that are served immediately while one background task refreshes them.
+    Concurrent misses for the same key share a single upstream call.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int, shared: Optional[StateBackend] = None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._data: "OrderedDict[Hashable, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._refreshing: Set[Hashable] = set()
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+        self.shared_hits = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings, shared: Optional[StateBackend] = None) -> "SearchCache":
+        return cls(
+            settings.search_cache_ttl,
+            settings.search_cache_stale_ttl,
+            settings.search_cache_max_entries,
+            shared,
+        )
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[List[Dict[str, Any]]]],
+    ) -> List[Dict[str, Any]]:
+        entry = self._data.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.inc("search", "hit")
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                CACHE_REQUESTS.inc("search", "stale")
+                self._revalidate(key, fetch)
+                return entry[1]
+            del self._data[key]
+
+        self.misses += 1
+        CACHE_REQUESTS.inc("search", "miss")
+        return await self._flight.do(key, lambda: self._load(key, fetch))
+
+    async def _load_shared(self, key: Hashable) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        """(monotonic fetch time, results) from the shared tier, which only holds fresh entries"""
+        try:
+            raw = await self.shared.get(f"search:{key!r}")
+        except StateBackendError as e:
+            logger.warning("Shared search cache unavailable: %s", e)
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        # Keep the entry's real age: it was fetched by another worker, maybe a while ago
+        return time.monotonic() - max(0.0, time.time() - entry["fetched_at"]), entry["results"]
+
+    async def _store_shared(self, key: Hashable, results: List[Dict[str, Any]]):
+        try:
+            await self.shared.set(
+                f"search:{key!r}", json.dumps({"fetched_at": time.time(), "results": results}), self.ttl
+            )
+        except StateBackendError as e:
+            logger.warning("Shared search cache unavailable: %s", e)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]):
+        entry = await self._load_shared(key) if self.shared is not None else None
+        if entry is not None:
+            self.shared_hits += 1
+            fetched_at, results = entry
+        else:
+            fetched_at, results = time.monotonic(), await fetch()
+            if results and self.shared is not None:
+                await self._store_shared(key, results)
+        # Empty results usually mean an upstream problem; don't pin them
+        if results:
+            self._data[key] = (fetched_at, results)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return results
+
+    def _revalidate(self, key: Hashable, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]):
+        if key in self._refreshing or key in self._flight:
+            return
+        self.refreshes += 1
+        self._refreshing.add(key)
+        task = detached(self._flight.do(key, lambda: self._load(key, fetch)))
+        self._background.add(task)
+        task.add_done_callback(lambda t: self._refresh_done(key, t))
+
+    def _refresh_done(self, key: Hashable, task: asyncio.Task):
+        self._refreshing.discard(key)
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_errors += 1
+            logger.warning("Search cache refresh failed: %s", task.exception())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "evictions": self.evictions,
+            "shared_hits": self.shared_hits,
+            "coalesced": self._flight.coalesced,
+        }
@@ -1,19 +1,28 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
     """Application settings loaded from environment variables"""
     
-    # Required API keys
-    api_key: str
-    google_api_key: str 
-    serpapi_api_key: str
+    # API keys; only the providers actually in use need theirs, checked at warm-up
+    api_key: Optional[str] = None
+    google_api_key: Optional[str] = None
+    serpapi_api_key: Optional[str] = None
+    
+    # Cold start: requests arriving during agent warm-up wait this long before a 503
+    warmup_wait_timeout: float = 10.0
     
     # Environment - kept development as of now (change to production later)
     environment: str = "production"
     log_level: str = "INFO"
+    log_debug_dumps: bool = False  # log raw LLM responses at DEBUG (development only)
+    
+    # Optional OpenTelemetry trace export (needs opentelemetry-sdk + OTLP exporter)
+    otel_enabled: bool = False
+    otel_endpoint: str = "http://localhost:4317"
+    otel_service_name: str = "marketing-agent-backend"
     
     
     cors_origins: List[str] = [
@@ -24,9 +33,161 @@ class Settings(BaseSettings):
     max_prompt_length: int = 10000
     max_results_limit: int = 50
     request_timeout: int = 60
+    cancel_on_disconnect: bool = True  # stop /analyze work when the client goes away
+    
+    # /analyze/batch fan-out (rate limits apply to batch traffic only);
+    # batch_search_rpm counts analyses, so with research on it allows
+    # (1 + facets) times as many SerpAPI calls
+    batch_max_items: int = 500
+    batch_concurrency: int = 8
+    batch_search_rpm: float = 120
+    batch_llm_rpm: float = 60
+    
+    # Research stage: the prompt plus one search per facet, run concurrently and merged.
+    # Off by default: each facet is one more SerpAPI call per uncached analysis,
+    # so the four below make five calls where one did before
+    research_enabled: bool = False
+    research_facets: List[str] = ["trends", "competitors", "pricing", "audience"]
+    research_max_sources: int = 10
+    research_snippet_similarity: float = 0.8
+    
+    # Prompt context budget (estimated input tokens, including the fixed instructions)
+    llm_input_token_budget: int = 2000
+    context_snippet_max_chars: int = 300
+    
+    # Process-wide upstream rate limits shared by all traffic (0 = unlimited);
+    # interactive requests are served before /analyze/batch and /jobs work
+    search_rpm: float = 0
+    search_daily_quota: int = 0
+    llm_rpm: float = 0
+    llm_tpm: float = 0
+    llm_daily_quota: int = 0
+    upstream_backoff_seconds: float = 10.0  # pause after a 429 without Retry-After
+    
+    # Upstream resilience: retries (decorrelated jitter), hedging, circuit breaker
+    retry_max_attempts: int = 3
+    retry_base_delay: float = 0.2
+    retry_max_delay: float = 5.0
+    hedge_search: bool = False  # each hedged SerpAPI call is billed and counts against the quota
+    hedge_llm: bool = False  # a hedged Gemini call is billed twice
+    hedge_percentile: float = 0.95
+    hedge_min_samples: int = 20
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+    
+    # Analysis pipeline (research -> analysis -> summary): per-node timeouts in
+    # seconds and concurrency limits (0 = none beyond the caller's own deadline,
+    # i.e. request_timeout or jobs_timeout, and the upstream limits). A node
+    # timeout fails the analysis like the caller's timeout would; a retry
+    # after a failed node resumes from checkpoints
+    pipeline_research_timeout: float = 0
+    pipeline_analysis_timeout: float = 0
+    pipeline_summary_timeout: float = 0
+    pipeline_research_concurrency: int = 0
+    pipeline_analysis_concurrency: int = 0
+    pipeline_summary_concurrency: int = 0
+    pipeline_checkpoints_enabled: bool = True
+    pipeline_checkpoint_ttl: int = 900
+    pipeline_checkpoint_max_entries: int = 1024
+    
+    # /jobs queue mode (no request_timeout; jobs_timeout bounds each job instead)
+    jobs_workers: int = 4
+    jobs_max_queue: int = 1000
+    jobs_timeout: int = 600
+    jobs_max_retained: int = 10000
+    jobs_sqlite_path: Optional[str] = None  # e.g. "jobs.sqlite3" to keep results across restarts
+    jobs_sqlite_max_rows: int = 100000
+    jobs_shared_ttl: int = 24 * 3600  # how long job status stays in a shared STATE_BACKEND
+    
+    # Upstream providers: "serpapi" / "gemini", or "mock" for offline load testing
+    search_provider: str = "serpapi"
+    llm_provider: str = "gemini"
+    
+    # Record/replay of upstream calls (app/replay.py): "live" calls the providers,
+    # "record" also appends every exchange and its latency to cassette_path,
+    # "replay" serves them from there with no network access or API keys.
+    # replay_latency_scale multiplies recorded latencies (0 = none)
+    upstream_mode: str = "live"
+    cassette_path: str = "cassettes/upstream.jsonl.gz"
+    replay_latency_scale: float = 1.0
+    
+    # Mock provider behaviour (latency distribution: fixed, uniform or lognormal)
+    mock_latency_distribution: str = "lognormal"
+    mock_latency_sigma: float = 0.5
+    mock_search_latency_ms: float = 300.0
+    mock_llm_latency_ms: float = 1500.0
+    mock_search_failure_rate: float = 0.0
+    mock_llm_failure_rate: float = 0.0
+    mock_seed: int = 0
     
     # Google Gemini settings
     gemini_model: str = "gemini-2.5-flash"
+    gemini_async: bool = True  # False: run the sync SDK on a dedicated bounded thread pool
+    gemini_structured_output: bool = True  # JSON mode with a response schema; no text extraction needed
+    
+    # Admission control for Gemini calls
+    llm_max_concurrency: int = 16
+    llm_max_queue: int = 64
+    llm_queue_timeout: float = 10.0
+    
+    # Shared HTTP client (SerpAPI) connection pool
+    http2_enabled: bool = True
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 30.0
+    http_connect_timeout: float = 5.0
+    http_read_timeout: float = 30.0
+    http_pool_timeout: float = 10.0
+    
+    # /analyze response cache (LRU in memory, optional SQLite tier on disk)
+    cache_enabled: bool = True
+    cache_ttl: int = 3600
+    cache_max_entries: int = 1024
+    cache_sqlite_path: Optional[str] = None
+    cache_sqlite_max_rows: int = 100000
+    
+    # Semantic cache for paraphrased prompts: a neighbour at or above
+    # semantic_cache_threshold reuses the whole response, one at or above
+    # semantic_cache_sources_threshold only its search results. With the hashing
+    # embedder one changed word in five scores 0.8, so a paraphrase such as
+    # "AI design tools market trends" / "trends in AI-powered design tools" only
+    # reuses search results; lowering the response threshold to catch it would
+    # also serve "coffee shops" a "tea shops" analysis
+    semantic_cache_enabled: bool = True
+    semantic_cache_embedder: str = "hashing"
+    semantic_cache_dimensions: int = 1 << 20
+    semantic_cache_threshold: float = 0.9
+    semantic_cache_sources_threshold: float = 0.8
+    semantic_cache_ttl: int = 3600
+    semantic_cache_max_entries: int = 1024
+    
+    # History of finished analyses (SQLite + FTS5), written in batches off the request path.
+    # Opt-in: it keeps every prompt and response in history_sqlite_path
+    history_enabled: bool = False
+    history_sqlite_path: str = "history.db"
+    history_batch_size: int = 50
+    history_flush_interval: float = 1.0
+    history_max_pending: int = 10000
+    history_max_rows: int = 100000
+    
+    # Multi-worker mode (gunicorn.conf.py, or WEB_WORKERS for `python -m app.main`):
+    # state_backend is where caches, single-flight and rate limits are shared between
+    # workers. memory = each worker keeps its own; sqlite = one file per host;
+    # redis = any Redis-protocol server (bench/resp_server.py is a local stand-in).
+    # /jobs needs a shared backend when web_workers > 1 and is disabled otherwise
+    web_workers: int = 1
+    state_backend: str = "memory"
+    state_sqlite_path: str = "shared_state.db"
+    state_redis_url: str = "redis://localhost:6379/0"
+    state_redis_max_connections: int = 10
+    state_flight_lock_ttl: float = 60.0
+    
+    # SerpAPI search-result cache (stale entries are served while refreshing)
+    search_engine: str = "google"
+    search_cache_enabled: bool = True
+    search_cache_ttl: int = 3600
+    search_cache_stale_ttl: int = 6 * 3600
+    search_cache_max_entries: int = 2048
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,124 @@
+# backend/app/context.py
+## Token-budgeted prompt construction for the LLM call.
+## The instructions and the example JSON never change, so they are built
+## and counted once; the query and as many ranked sources as fit the
+## input-token budget follow. At roughly 300 tokens the fixed part is well
+## below the minimum for Gemini's implicit prefix caching.
+## Token counts use a local estimator: calling the SDK's count_tokens would
+## add a network round-trip to every request.
+
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+from .metrics import CONTEXT_SOURCES
+from .ratelimit import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+PROMPT_PREFIX = """You are an expert marketing analyst. Analyze the marketing query below and provide actionable insights.
+
+INSTRUCTIONS:
+1. Generate 3-5 high-quality marketing insights
+2. Each insight must have: title, detail, confidence (0.7-0.95), category
+3. Categories can be: Strategy, Channels, Content, Analytics, Audience, ROI, Tools
+4. Use specific data from search results
+5. Make insights actionable
+
+CRITICAL: Return ONLY this JSON structure (no other text):
+{
+    "insights": [
+        {
+            "title": "Content Marketing Drives B2B Growth",
+            "detail": "Content marketing generates 3x more leads than traditional methods. Focus on long-form blog posts, whitepapers, and case studies to establish thought leadership.",
+            "confidence": 0.87,
+            "category": "Strategy"
+        },
+        {
+            "title": "LinkedIn Outperforms for Professional Engagement",
+            "detail": "LinkedIn delivers the highest B2B engagement rates at 2.8% compared to 0.5% on other platforms. Invest in LinkedIn Ads and organic content strategy.",
+            "confidence": 0.82,
+            "category": "Channels"
+        }
+    ]
+}
+"""
+
+PROMPT_SUFFIX = "\nReturn ONLY the JSON object with 3-5 insights. No explanation, no markdown formatting."
+
+NO_RESULTS = "No search results available. Provide insights based on general marketing knowledge."
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, at a word boundary when possible"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0] if " " in text[:max_chars] else text[:max_chars]
+    return cut.rstrip(" ,.;:") + "..."
+
+
+class ContextBuilder:
+    """Builds the LLM prompt within `token_budget` input tokens"""
+
+    def __init__(
+        self,
+        token_budget: int,
+        snippet_max_chars: int = 300,
+        min_snippet_chars: int = 80,
+        count_tokens: Callable[[str], int] = estimate_tokens
+    ):
+        self.token_budget = token_budget
+        self.snippet_max_chars = snippet_max_chars
+        self.min_snippet_chars = min_snippet_chars
+        self.count_tokens = count_tokens
+        # Static part is counted once
+        self.fixed_tokens = count_tokens(PROMPT_PREFIX) + count_tokens(PROMPT_SUFFIX)
+
+    def _source(self, number: int, result: Dict[str, Any], snippet: str) -> str:
+        return f"Source {number}: {result.get('title', '')}\n{snippet}\nURL: {result.get('url', '')}"
+
+    def build(self, prompt: str, search_results: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        """Return the prompt and its budget report; search_results must be ranked best-first"""
+        # The query is kept even when long, but gets at most half of what the instructions leave
+        query_budget_chars = max((self.token_budget - self.fixed_tokens) // 2, 32) * 4
+        query = _truncate(prompt, query_budget_chars)
+        header = f"\nMarketing Query: {query}\n\nWeb Search Results:\n"
+        remaining = self.token_budget - self.fixed_tokens - self.count_tokens(header)
+
+        entries: List[str] = []
+        truncated = 0
+        for result in search_results:
+            snippet = result.get("snippet", "") or ""
+            short = _truncate(snippet, self.snippet_max_chars)
+            entry = self._source(len(entries) + 1, result, short)
+            cost = self.count_tokens(entry + "\n\n")
+            if cost > remaining:
+                # Last source that fits only partly: keep a shorter snippet if it is still useful
+                fixed = self.count_tokens(self._source(len(entries) + 1, result, "") + "\n\n")
+                room_chars = (remaining - fixed) * 4
+                if room_chars >= self.min_snippet_chars:
+                    entries.append(self._source(len(entries) + 1, result, _truncate(snippet, room_chars)))
+                    truncated += 1
+                break
+            if short != snippet:
+                truncated += 1
+            entries.append(entry)
+            remaining -= cost
+
+        dropped = len(search_results) - len(entries)
+        if dropped:
+            CONTEXT_SOURCES.inc("dropped", amount=dropped)
+        if truncated:
+            CONTEXT_SOURCES.inc("truncated", amount=truncated)
+        if entries:
+            CONTEXT_SOURCES.inc("used", amount=len(entries))
+
+        context = "\n\n".join(entries) if entries else NO_RESULTS
+        full_prompt = PROMPT_PREFIX + header + context + "\n" + PROMPT_SUFFIX
+        report = {
+            "prompt_tokens": self.count_tokens(full_prompt),
+            "sources_used": len(entries),
+            "sources_dropped": dropped,
+        }
+        return full_prompt, report
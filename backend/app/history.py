@@ -0,0 +1,311 @@
+# backend/app/history.py
+## Persistent history of finished analyses.
+## Every fresh AnalyzeResponse is queued and written to SQLite by a
+## background task in batched transactions, off the request path. Insights
+## are indexed with FTS5 so /search can query past results by text,
+## category and confidence instead of regenerating them; /history pages
+## through analyses newest first.
+
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Settings
+from .schemas import AnalyzeResponse, HistoryEntry, Insight, InsightSearchHit
+
+
+logger = logging.getLogger(__name__)
+
+
+_WORD = re.compile(r"\w+")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS analyses ("
+    " id INTEGER PRIMARY KEY, created_at REAL NOT NULL, prompt TEXT NOT NULL,"
+    " max_results INTEGER NOT NULL, processing_time REAL NOT NULL,"
+    " sources TEXT NOT NULL, timings TEXT, usage TEXT)",
+    "CREATE TABLE IF NOT EXISTS insights ("
+    " id INTEGER PRIMARY KEY, analysis_id INTEGER NOT NULL, position INTEGER NOT NULL,"
+    " title TEXT NOT NULL, detail TEXT NOT NULL, confidence REAL NOT NULL, category TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS insights_analysis ON insights (analysis_id)",
+    "CREATE INDEX IF NOT EXISTS insights_category ON insights (category COLLATE NOCASE, confidence)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS insights_fts USING fts5("
+    " title, detail, content='insights', content_rowid='id', tokenize='porter unicode61')",
+)
+
+
+def fts_query(text: str) -> str:
+    """Quote each word so user input can't be parsed as FTS5 syntax; words are ANDed"""
+    return " ".join(f'"{word}"' for word in _WORD.findall(text))
+
+
+def _timestamp(value: datetime) -> float:
+    # AnalyzeResponse timestamps are naive UTC
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _datetime(value: float) -> datetime:
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+class SQLiteAnalysisDB:
+    """Blocking SQLite side of the store; AnalysisStore runs it in worker threads"""
+
+    def __init__(self, path: str, max_rows: int):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._batches = 0
+
+    def insert_many(self, batch: List[Tuple[str, int, AnalyzeResponse]]):
+        """Write a batch of analyses, their insights and index entries in one transaction"""
+        with self._lock, self._conn:
+            first_insight = None
+            for prompt, max_results, response in batch:
+                cursor = self._conn.execute(
+                    "INSERT INTO analyses (created_at, prompt, max_results, processing_time, sources, timings, usage)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        _timestamp(response.timestamp),
+                        prompt,
+                        max_results,
+                        response.processing_time,
+                        json.dumps([source.model_dump() for source in response.sources]),
+                        json.dumps(response.timings) if response.timings is not None else None,
+                        json.dumps(response.usage) if response.usage is not None else None,
+                    )
+                )
+                analysis_id = cursor.lastrowid
+                for position, insight in enumerate(response.insights):
+                    cursor = self._conn.execute(
+                        "INSERT INTO insights (analysis_id, position, title, detail, confidence, category)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (analysis_id, position, insight.title, insight.detail, insight.confidence, insight.category)
+                    )
+                    if first_insight is None:
+                        first_insight = cursor.lastrowid
+            if first_insight is not None:
+                self._conn.execute(
+                    "INSERT INTO insights_fts (rowid, title, detail)"
+                    " SELECT id, title, detail FROM insights WHERE id >= ?",
+                    (first_insight,)
+                )
+            self._batches += 1
+            if self._batches % 20 == 0:
+                self._prune()
+
+    def _prune(self):
+        row = self._conn.execute(
+            "SELECT id FROM analyses ORDER BY id DESC LIMIT 1 OFFSET ?", (self.max_rows,)
+        ).fetchone()
+        if row is None:
+            return
+        # External-content FTS rows must be deleted with their original values
+        self._conn.execute(
+            "INSERT INTO insights_fts (insights_fts, rowid, title, detail)"
+            " SELECT 'delete', id, title, detail FROM insights WHERE analysis_id <= ?",
+            (row[0],)
+        )
+        self._conn.execute("DELETE FROM insights WHERE analysis_id <= ?", (row[0],))
+        self._conn.execute("DELETE FROM analyses WHERE id <= ?", (row[0],))
+
+    def history(self, limit: int, offset: int) -> List[HistoryEntry]:
+        """Analyses newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, prompt, max_results, processing_time, sources, timings, usage"
+                " FROM analyses ORDER BY id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+            insights: Dict[int, List[Insight]] = {row[0]: [] for row in rows}
+            if rows:
+                placeholders = ",".join("?" * len(rows))
+                for analysis_id, title, detail, confidence, category in self._conn.execute(
+                    "SELECT analysis_id, title, detail, confidence, category FROM insights"
+                    f" WHERE analysis_id IN ({placeholders}) ORDER BY analysis_id, position",
+                    list(insights)
+                ):
+                    insights[analysis_id].append(
+                        Insight(title=title, detail=detail, confidence=confidence, category=category)
+                    )
+
+        return [
+            HistoryEntry(
+                id=analysis_id,
+                created_at=_datetime(created_at),
+                prompt=prompt,
+                max_results=max_results,
+                processing_time=processing_time,
+                insights=insights[analysis_id],
+                sources=json.loads(sources),
+                timings=json.loads(timings) if timings is not None else None,
+                usage=json.loads(usage) if usage is not None else None
+            )
+            for analysis_id, created_at, prompt, max_results, processing_time, sources, timings, usage in rows
+        ]
+
+    def search(
+        self,
+        text: Optional[str],
+        category: Optional[str],
+        min_confidence: Optional[float],
+        max_confidence: Optional[float],
+        limit: int,
+        offset: int
+    ) -> List[InsightSearchHit]:
+        """Insights matching every given filter; best text match first, else newest first"""
+        conditions: List[str] = []
+        params: List[Any] = []
+        if text:
+            source = "insights_fts JOIN insights i ON i.id = insights_fts.rowid"
+            conditions.append("insights_fts MATCH ?")
+            params.append(fts_query(text))
+            order = "insights_fts.rank"
+        else:
+            source = "insights i"
+            order = "i.id DESC"
+        if category:
+            conditions.append("i.category = ? COLLATE NOCASE")
+            params.append(category)
+        if min_confidence is not None:
+            conditions.append("i.confidence >= ?")
+            params.append(min_confidence)
+        if max_confidence is not None:
+            conditions.append("i.confidence <= ?")
+            params.append(max_confidence)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT i.analysis_id, a.prompt, a.created_at, i.title, i.detail, i.confidence, i.category"
+                f" FROM {source} JOIN analyses a ON a.id = i.analysis_id{where}"
+                f" ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return [
+            InsightSearchHit(
+                analysis_id=analysis_id,
+                prompt=prompt,
+                created_at=_datetime(created_at),
+                insight=Insight(title=title, detail=detail, confidence=confidence, category=category)
+            )
+            for analysis_id, prompt, created_at, title, detail, confidence, category in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AnalysisStore:
+    """Queues finished analyses and writes them to SQLite in batches from one background task"""
+
+    def __init__(self, db: SQLiteAnalysisDB, batch_size: int = 50, flush_interval: float = 1.0, max_pending: int = 10000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "asyncio.Queue[Tuple[str, int, AnalyzeResponse]]" = asyncio.Queue(maxsize=max_pending)
+        self._writer: Optional[asyncio.Task] = None
+        # Batch being collected; kept here so a cancelled writer doesn't lose it
+        self._batch: List[Tuple[str, int, AnalyzeResponse]] = []
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "AnalysisStore":
+        return cls(
+            SQLiteAnalysisDB(settings.history_sqlite_path, settings.history_max_rows),
+            batch_size=settings.history_batch_size,
+            flush_interval=settings.history_flush_interval,
+            max_pending=settings.history_max_pending
+        )
+
+    def record(self, prompt: str, max_results: int, response: AnalyzeResponse):
+        """Queue an analysis for writing; never blocks the caller"""
+        try:
+            self._queue.put_nowait((prompt, max_results, response))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("History queue full; analysis not recorded")
+            return
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._write_loop())
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            # Collect more for up to flush_interval so writes share a transaction
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, int, AnalyzeResponse]]):
+        try:
+            await asyncio.to_thread(self.db.insert_many, batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("Failed to write %d analyses to history: %s", len(batch), e)
+        else:
+            self.written += len(batch)
+            self.batches += 1
+
+    async def history(self, limit: int, offset: int) -> List[HistoryEntry]:
+        return await asyncio.to_thread(self.db.history, limit, offset)
+
+    async def search(
+        self,
+        text: Optional[str] = None,
+        category: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        max_confidence: Optional[float] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[InsightSearchHit]:
+        if text is not None and not fts_query(text):
+            return []
+        return await asyncio.to_thread(
+            self.db.search, text, category, min_confidence, max_confidence, limit, offset
+        )
+
+    async def aclose(self):
+        """Stop the writer, write whatever is still queued and close the database"""
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+        self.db.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,60 @@
+# backend/app/http_client.py
+## Shared, pooled HTTP client for upstream APIs (SerpAPI).
+## One long-lived client keeps TCP/TLS connections alive between requests
+## instead of paying a new handshake on every /analyze call.
+
+import logging
+from typing import Dict
+
+import httpx
+
+from .config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (installed via httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """Build the pooled AsyncClient from settings"""
+    http2 = settings.http2_enabled and _http2_available()
+    if settings.http2_enabled and not http2:
+        logger.warning("HTTP/2 requested but `h2` is not installed; using HTTP/1.1")
+
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        settings.http_read_timeout,
+        connect=settings.http_connect_timeout,
+        pool=settings.http_pool_timeout,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def pool_stats(client: httpx.AsyncClient) -> Dict[str, int]:
+    """Report connection pool usage: checked-out, idle and waiting requests"""
+    pool = getattr(client, "_transport", None)
+    pool = getattr(pool, "_pool", None)
+    if pool is None:
+        return {"connections": 0, "checked_out": 0, "idle": 0, "waiting": 0}
+
+    connections = list(pool.connections)
+    idle = sum(1 for c in connections if c.is_idle())
+    waiting = sum(1 for r in getattr(pool, "_requests", []) if r.is_queued())
+    return {
+        "connections": len(connections),
+        "checked_out": len(connections) - idle,
+        "idle": idle,
+        "waiting": waiting,
+    }
@@ -0,0 +1,264 @@
+# backend/app/jobs.py
+## Job mode for long analyses.
+## POST /jobs enqueues an analysis and returns immediately; a bounded pool of
+## worker tasks runs MarketingAgent.run without the interactive
+## request_timeout, and results are kept in a size-bounded store (memory,
+## plus an optional SQLite file) for polling via GET /jobs/{id}. With a
+## shared STATE_BACKEND every status change is also published there, so
+## any worker can answer GET /jobs/{id} while the job is queued or running.
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .admission import OverloadedError
+from .agent import MarketingAgent
+from .config import Settings
+from .logging_config import request_id_var
+from .ratelimit import BACKGROUND, priority
+from .resilience import request_deadline
+from .metrics import JOB_RUN_SECONDS, JOB_WAIT_SECONDS
+from .schemas import AnalyzeRequest, JobStatusResponse
+from .shared_state import StateBackendError
+
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """One queued analysis and its outcome"""
+
+    def __init__(self, request: AnalyzeRequest):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.enqueued = time.monotonic()
+        self.queue_wait: Optional[float] = None
+        self.result = None
+        self.error: Optional[str] = None
+
+    def to_response(self) -> JobStatusResponse:
+        return JobStatusResponse(
+            job_id=self.id,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            queue_wait=round(self.queue_wait, 3) if self.queue_wait is not None else None,
+            result=self.result,
+            error=self.error
+        )
+
+
+class SQLiteJobStore:
+    """Persistent tier for finished jobs; rows beyond max_rows are pruned oldest-first"""
+
+    def __init__(self, path: str, max_rows: int):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, finished_at REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._writes = 0
+
+    def put(self, job_id: str, payload: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, finished_at, payload) VALUES (?, ?, ?)",
+                (job_id, time.time(), payload)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE id NOT IN "
+                    "(SELECT id FROM jobs ORDER BY finished_at DESC LIMIT ?)",
+                    (self.max_rows,)
+                )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """Bounded queue of analysis jobs drained by a fixed pool of worker tasks"""
+
+    def __init__(self, agent: MarketingAgent, settings: Settings):
+        self.agent = agent
+        self.num_workers = settings.jobs_workers
+        self.job_timeout = settings.jobs_timeout
+        self.max_retained = settings.jobs_max_retained
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=settings.jobs_max_queue)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._workers: List[asyncio.Task] = []
+        self.shared = agent.state
+        self.shared_ttl = settings.jobs_shared_ttl
+        self.disk = None
+        if settings.jobs_sqlite_path:
+            self.disk = SQLiteJobStore(settings.jobs_sqlite_path, settings.jobs_sqlite_max_rows)
+        self.busy = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        for i in range(self.num_workers):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"job-worker-{i}"))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        if self.disk is not None:
+            self.disk.close()
+
+    async def submit(self, request: AnalyzeRequest) -> Job:
+        """Enqueue an analysis; raises OverloadedError when the queue is full"""
+        job = Job(request)
+        if self._queue.full():
+            self.rejected += 1
+            raise OverloadedError("jobs", "queue full", retry_after=5.0)
+        # Published before a worker can pick it up, so "queued" never overwrites "running"
+        await self._publish(job)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            await self._unpublish(job)
+            raise OverloadedError("jobs", "queue full", retry_after=5.0)
+        self._remember(job)
+        self.submitted += 1
+        return job
+
+    async def _publish(self, job: Job):
+        """Share the job's current status with the other workers"""
+        if self.shared is None:
+            return
+        try:
+            await self.shared.set(f"job:{job.id}", job.to_response().model_dump_json(), self.shared_ttl)
+        except StateBackendError as e:
+            logger.warning("Shared job state unavailable: %s", e)
+
+    async def _unpublish(self, job: Job):
+        if self.shared is None:
+            return
+        try:
+            await self.shared.delete(f"job:{job.id}")
+        except StateBackendError:
+            pass  # expires on its own
+
+    def _remember(self, job: Job):
+        self._jobs[job.id] = job
+        # Forget the oldest finished jobs first; queued and running ones stay
+        excess = len(self._jobs) - self.max_retained
+        if excess > 0:
+            for job_id in [k for k, j in self._jobs.items() if j.finished_at is not None][:excess]:
+                del self._jobs[job_id]
+
+    async def get(self, job_id: str) -> Optional[JobStatusResponse]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_response()
+        if self.shared is not None:
+            try:
+                payload = await self.shared.get(f"job:{job_id}")
+            except StateBackendError as e:
+                logger.warning("Shared job state unavailable: %s", e)
+                payload = None
+            if payload is not None:
+                return JobStatusResponse.model_validate_json(payload)
+        if self.disk is not None:
+            payload = await asyncio.to_thread(self.disk.get, job_id)
+            if payload is not None:
+                return JobStatusResponse.model_validate_json(payload)
+        return None
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self.busy += 1
+            try:
+                await self._execute(job)
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    async def _execute(self, job: Job):
+        # Workers outlive requests, so tag this job's log lines with its own ID
+        request_id_var.set(f"job-{job.id[:12]}")
+        job.queue_wait = time.monotonic() - job.enqueued
+        JOB_WAIT_SECONDS.observe(job.queue_wait)
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        await self._publish(job)
+        start = time.perf_counter()
+
+        request = job.request
+        try:
+            # Upstream calls for jobs yield to interactive and batch traffic
+            with priority(BACKGROUND), request_deadline(self.job_timeout):
+                result = await asyncio.wait_for(
+                    self.agent.run(request.prompt, max_results=request.max_results, use_cache=not request.no_cache),
+                    timeout=self.job_timeout
+                )
+            if not request.include_timings:
+                result = result.model_copy(update={"timings": None})
+            job.result = result
+            job.status = "succeeded"
+            self.succeeded += 1
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Cancelled during shutdown"
+            raise
+        except asyncio.TimeoutError as e:
+            # Empty from wait_for; a pipeline node timeout names the node
+            job.status = "failed"
+            job.error = str(e) or f"Timeout after {self.job_timeout}s"
+            self.failed += 1
+        except Exception as e:
+            logger.warning("Job %s failed: %s", job.id, e)
+            job.status = "failed"
+            job.error = str(e)
+            self.failed += 1
+        finally:
+            job.finished_at = datetime.utcnow()
+            JOB_RUN_SECONDS.observe(time.perf_counter() - start)
+
+        await self._publish(job)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, job.id, job.to_response().model_dump_json())
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "workers": self.num_workers,
+            "busy_workers": self.busy,
+            "utilization": round(self.busy / self.num_workers, 3) if self.num_workers else 0.0,
+            "retained": len(self._jobs),
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,165 @@
+# backend/app/json_stream.py
+## Incremental JSON parsing for Gemini output.
+## Text arrives in arbitrary chunks; the parser yields each complete object
+## of the top-level "insights" array as soon as its closing brace arrives.
+## parse_insights_document applies the same scanning to a full response: it
+## finds the first balanced object carrying "insights", and when the output
+## was cut off it recovers the insights that did complete.
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class InsightStreamParser:
+    """Yield complete insight objects from a streamed `{"insights": [...]}` document.
+
+    Feed text chunks with `feed()`; each call returns the insight dicts that
+    were completed by that chunk. Only elements of an array stored under the
+    "insights" key are captured, so other arrays are ignored, and markdown
+    fences or prose around the JSON (even with a stray brace) are skipped.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []
+        # Key each open container is stored under (None inside arrays)
+        self._keys: List[Optional[str]] = []
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._last_string: Optional[str] = None
+        self._capture: List[str] = []
+        # Stack depth of the insights array while an element is being captured
+        self._capture_depth = -1
+        self._started = False
+        self.emitted = 0
+
+    def _is_item_start(self) -> bool:
+        # An object directly inside the array stored under "insights"
+        return bool(self._stack) and self._stack[-1] == "[" and self._keys[-1] == "insights"
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        completed = []
+        for ch in chunk:
+            if not self._started:
+                if ch != "{":
+                    continue
+                self._started = True
+
+            capturing = self._capture_depth >= 0
+            if capturing:
+                self._capture.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if not capturing:
+                        self._last_string = "".join(self._string)
+                    continue
+                if not capturing:
+                    self._string.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string = []
+            elif ch in "{[":
+                if ch == "{" and not capturing and self._is_item_start():
+                    self._capture_depth = len(self._stack)
+                    self._capture = [ch]
+                in_object = bool(self._stack) and self._stack[-1] == "{"
+                self._keys.append(self._last_string if in_object else None)
+                self._stack.append(ch)
+                self._last_string = None
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                    self._keys.pop()
+                if ch == "}" and capturing and len(self._stack) == self._capture_depth:
+                    self._capture_depth = -1
+                    try:
+                        completed.append(json.loads("".join(self._capture)))
+                        self.emitted += 1
+                    except json.JSONDecodeError:
+                        pass
+                    self._capture = []
+                self._last_string = None
+            elif ch == ",":
+                self._last_string = None
+        return completed
+
+
+def _closing_brace(text: str, start: int) -> int:
+    """Index of the brace closing the `{` at text[start], or -1 if it never closes"""
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def iter_json_objects(text: str) -> Iterator[str]:
+    """Yield each balanced top-level `{...}` span of text, skipping prose in between.
+
+    A `{` that never closes (a stray brace in prose, or output cut off) is
+    skipped and scanning restarts at the next one.
+    """
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        if start < 0:
+            return
+        end = _closing_brace(text, start)
+        if end < 0:
+            pos = start + 1
+            continue
+        yield text[start:end + 1]
+        pos = end + 1
+
+
+def parse_insights_document(text: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Parse an LLM response into `{"insights": [...]}`.
+
+    Returns (document, outcome) where outcome is "complete", "recovered"
+    (output was truncated or malformed; only whole insight objects kept)
+    or "failed" (document is None).
+    """
+    # Structured output mode returns bare JSON: no scanning needed
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict) and isinstance(parsed.get("insights"), list):
+            return parsed, "complete"
+    except ValueError:
+        pass
+
+    for candidate in iter_json_objects(text):
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict) and isinstance(parsed.get("insights"), list):
+            return parsed, "complete"
+
+    recovered = InsightStreamParser().feed(text)
+    if recovered:
+        return {"insights": recovered}, "recovered"
+    return None, "failed"
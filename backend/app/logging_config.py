@@ -0,0 +1,72 @@
+# backend/app/logging_config.py
+## Non-blocking logging for the request path.
+## Handlers on the event-loop thread only enqueue records (QueueHandler);
+## a QueueListener thread does the formatting and stdout I/O, so a slow or
+## blocked stdout pipe can't stall the loop. Every record carries the
+## request ID of the HTTP request that produced it.
+
+import atexit
+import logging
+import queue
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from .config import Settings
+
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID to each record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class _ContextQueueHandler(QueueHandler):
+    """QueueHandler that captures the request ID before the record leaves the loop thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        return super().prepare(record)
+
+
+def setup_logging(settings: Settings):
+    """Route all logging through a queue drained by a background thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    output.addFilter(RequestIdFilter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _ContextQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
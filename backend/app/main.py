@@ -1,21 +1,140 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, Awaitable, Optional
 import asyncio
+import importlib
+import json
 import logging
+import os
+import time
+import uuid
 
-from .schemas import AnalyzeRequest, AnalyzeResponse, HealthResponse
+from .schemas import (
+    AnalyzeRequest, AnalyzeResponse, HealthResponse, PoolStatsResponse,
+    BatchAnalyzeRequest, BatchAnalyzeResponse, JobSubmitResponse, JobStatusResponse,
+    HistoryResponse, InsightSearchResponse
+)
 from .agent import MarketingAgent
+from .batch import BatchRunner, collect_ordered
+from .jobs import JobQueue
+from .history import AnalysisStore
 from .config import get_settings, Settings
+from .http_client import create_http_client, pool_stats
+from .admission import OverloadedError
+from .metrics import REGISTRY, CLIENT_DISCONNECTS, HTTP_REQUEST_SECONDS, TIMEOUTS, gauge_family
+from .telemetry import configure_tracing, shutdown_tracing
+from .resilience import request_deadline
+from .logging_config import setup_logging, request_id_var
 
 
-logging.basicConfig(level=logging.INFO)
+setup_logging(get_settings())
 logger = logging.getLogger(__name__)
 
+
+def _component_metrics():
+    """Scrape-time gauges from the pool, caches, single-flight and admission stats"""
+    families = [
+        gauge_family("marketing_agent_http_pool", "Upstream HTTP connection pool usage",
+                     pool_stats(agent.get_http_client()), "state"),
+        gauge_family("marketing_agent_singleflight", "Single-flight coalescing of /analyze",
+                     agent.flight.stats(), "stat"),
+        gauge_family("marketing_agent_llm_admission", "Gemini admission control",
+                     agent.llm_admission.stats(), "stat"),
+        gauge_family("marketing_agent_search_rate_limit", "Process-wide SerpAPI rate limit",
+                     agent.search_limiter.stats(), "stat"),
+        gauge_family("marketing_agent_llm_rate_limit", "Process-wide Gemini rate limit",
+                     agent.llm_limiter.stats(), "stat"),
+        gauge_family("marketing_agent_search_resilience", "SerpAPI retries, hedging and breaker (state 0=closed 1=open 2=half-open)",
+                     agent.search_resilience.stats(), "stat"),
+        gauge_family("marketing_agent_llm_resilience", "Gemini retries, hedging and breaker (state 0=closed 1=open 2=half-open)",
+                     agent.llm_resilience.stats(), "stat"),
+    ]
+    if job_queue is not None:
+        families.append(gauge_family("marketing_agent_jobs", "/jobs queue depth and worker utilization",
+                                     job_queue.stats(), "stat"))
+    if agent.cache is not None:
+        stats = agent.cache.stats()
+        families.append(gauge_family("marketing_agent_response_cache", "Response cache (memory tier)",
+                                     {**stats["memory"], "saved_seconds": stats["saved_seconds"]}, "stat"))
+    if agent.search_cache is not None:
+        families.append(gauge_family("marketing_agent_search_cache", "Search-result cache",
+                                     agent.search_cache.stats(), "stat"))
+    if agent.shared_flight is not None:
+        families.append(gauge_family("marketing_agent_shared_singleflight", "Cross-worker coalescing of /analyze",
+                                     agent.shared_flight.stats(), "stat"))
+    if agent.history is not None:
+        families.append(gauge_family("marketing_agent_history", "Analysis history writer",
+                                     agent.history.stats(), "stat"))
+    if agent.pipeline.checkpoints is not None:
+        families.append(gauge_family("marketing_agent_pipeline_checkpoints", "Analysis pipeline checkpoints for resuming failed runs",
+                                     agent.pipeline.checkpoints.stats(), "stat"))
+    if agent.semantic_cache is not None:
+        families.append(gauge_family("marketing_agent_semantic_cache", "Semantic cache for paraphrased prompts",
+                                     agent.semantic_cache.stats(), "stat"))
+    if settings.upstream_mode != "live":
+        from .replay import open_cassette
+        families.append(gauge_family("marketing_agent_cassette", f"Upstream {settings.upstream_mode} cassette",
+                                     open_cassette(settings.cassette_path).stats(), "stat"))
+    return families
+
+
+async def _warm_up():
+    """Build the agent after the server is up; the heavy SDK import runs in a worker thread"""
+    global agent, batch_runner, job_queue, startup_error, startup_seconds
+    start = time.perf_counter()
+    try:
+        if settings.llm_provider == "gemini" and settings.upstream_mode != "replay":
+            await asyncio.to_thread(importlib.import_module, "google.generativeai")
+        if settings.upstream_mode == "replay":
+            from .replay import open_cassette
+
+            # Read the whole recording now, off the event loop, rather than on the first lookup
+            await asyncio.to_thread(open_cassette(settings.cassette_path).load)
+        # One pooled HTTP client for the whole process, shared by every request
+        agent = MarketingAgent(http_client=create_http_client(settings))
+        batch_runner = BatchRunner(agent, settings)
+        # Job workers are tasks on this event loop, so the queue is built here.
+        # Several workers with per-process state would each see only their own jobs
+        if settings.web_workers > 1 and agent.state is None:
+            logger.warning("/jobs disabled: %d workers need a shared STATE_BACKEND", settings.web_workers)
+        else:
+            job_queue = JobQueue(agent, settings)
+            job_queue.start()
+        REGISTRY.add_collector(_component_metrics)
+    except Exception as e:
+        startup_error = str(e)
+        logger.error("Agent warm-up failed: %s", e, exc_info=True)
+        return
+    startup_seconds = time.perf_counter() - start
+    logger.info("Agent ready after %.2fs warm-up", startup_seconds)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global agent, batch_runner, job_queue, warmup_task
+    configure_tracing(settings)
+    # Serve /health right away; the agent is built in the background
+    warmup_task = asyncio.create_task(_warm_up())
+    yield
+    if not warmup_task.done():
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    REGISTRY.clear_collectors()
+    if job_queue is not None:
+        await job_queue.stop()
+    shutdown_tracing()
+    if agent is not None:
+        await agent.aclose()
+    agent = batch_runner = job_queue = None
+
+
 app = FastAPI(
     title="Marketing Analysis API",
     description="AI-powered brand and marketing growth assistant using Google Gemini and SerpAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware that enables requests from frontend origins
@@ -28,19 +147,123 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-agent = MarketingAgent()
+# Built by _warm_up(); endpoints get them through the dependencies below
+agent: Optional[MarketingAgent] = None
+batch_runner: Optional[BatchRunner] = None
+job_queue: Optional[JobQueue] = None
+warmup_task: Optional[asyncio.Task] = None
+startup_error: Optional[str] = None
+startup_seconds: Optional[float] = None
+
+
+async def get_agent() -> MarketingAgent:
+    """The warmed-up agent; requests arriving during warm-up wait for it briefly"""
+    if agent is None and warmup_task is not None and not warmup_task.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(warmup_task), timeout=settings.warmup_wait_timeout)
+        except asyncio.TimeoutError:
+            pass
+    if agent is None:
+        detail = f"Service failed to start: {startup_error}" if startup_error else "Service is warming up"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    return agent
+
+
+async def get_batch_runner(agent: MarketingAgent = Depends(get_agent)) -> BatchRunner:
+    return batch_runner
+
+
+async def get_job_queue(agent: MarketingAgent = Depends(get_agent)) -> JobQueue:
+    if job_queue is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Jobs need STATE_BACKEND=sqlite or redis when running several workers"
+        )
+    return job_queue
+
+
+async def get_history(agent: MarketingAgent = Depends(get_agent)) -> AnalysisStore:
+    if agent.history is None:
+        raise HTTPException(status_code=404, detail="Analysis history is disabled; set HISTORY_ENABLED=true to record analyses")
+    return agent.history
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its response was ready"""
+
+
+async def _wait_for_disconnect(http_request: Request):
+    # The body has already been read, so the next message is the disconnect
+    while (await http_request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def cancel_on_disconnect(http_request: Request, work: Awaitable[Any], endpoint: str) -> Any:
+    """Await work, cancelling it and raising ClientDisconnected if the client disconnects first"""
+    if not settings.cancel_on_disconnect:
+        return await work
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task.done():
+        return task.result()
+    
+    CLIENT_DISCONNECTS.inc(endpoint)
+    logger.info("Client disconnected; cancelling %s", endpoint)
+    task.cancel()
+    # Let the cancellation reach the upstream calls before the handler returns
+    await asyncio.gather(task, return_exceptions=True)
+    raise ClientDisconnected()
 
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"{request.method} {request.url.path}")
-    response = await call_next(request)
-    return response
+    # Correlate every log line of this request; honour an upstream X-Request-ID
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    try:
+        logger.info("%s %s", request.method, request.url.path)
+        start = time.perf_counter()
+        response = await call_next(request)
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(response.status_code)
+        )
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        request_id_var.reset(token)
+
+
+@app.exception_handler(OverloadedError)
+async def overloaded_exception_handler(request: Request, exc: OverloadedError):
+    logger.warning("Rejected request: %s", exc)
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Service overloaded", "detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody reads this; 499 (nginx's "client closed request") keeps it apart in access metrics
+    return Response(status_code=499)
 
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=500,
         content={"error": "Internal server error", "detail": str(exc)}
@@ -58,6 +281,7 @@ async def root():
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
+    """Liveness: the process is up, whether or not the agent is ready yet"""
     return HealthResponse(
         status="healthy",
         version="1.0.0",
@@ -65,33 +289,298 @@ async def health_check():
     )
 
 
+@app.get("/ready", response_model=dict)
+async def readiness_check():
+    """Readiness: 200 once the agent has warmed up, 503 before that or if warm-up failed"""
+    if agent is not None:
+        return {"status": "ready", "startup_seconds": round(startup_seconds or 0.0, 3)}
+    if startup_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": startup_error})
+    return JSONResponse(status_code=503, content={"status": "starting"}, headers={"Retry-After": "1"})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/pool", response_model=PoolStatsResponse)
+async def http_pool_stats(agent: MarketingAgent = Depends(get_agent)):
+    return PoolStatsResponse(**pool_stats(agent.get_http_client()))
+
+
+@app.get("/cache", response_model=dict)
+async def cache_stats(agent: MarketingAgent = Depends(get_agent)):
+    return {
+        "response": agent.cache.stats() if agent.cache is not None else None,
+        "search": agent.search_cache.stats() if agent.search_cache is not None else None,
+        "semantic": agent.semantic_cache.stats() if agent.semantic_cache is not None else None,
+    }
+
+
+@app.get("/coalescing", response_model=dict)
+async def coalescing_stats(agent: MarketingAgent = Depends(get_agent)):
+    stats = agent.flight.stats()
+    if agent.shared_flight is not None:
+        stats["shared"] = agent.shared_flight.stats()
+    return stats
+
+
+@app.get("/state", response_model=dict)
+async def shared_state_stats(agent: MarketingAgent = Depends(get_agent)):
+    """Which backend this worker shares caches and rate limits through"""
+    return {
+        "backend": agent.state.name if agent.state is not None else "memory",
+        "pid": os.getpid(),
+        **(agent.state.stats() if agent.state is not None else {}),
+    }
+
+
+@app.get("/pipeline", response_model=dict)
+async def pipeline_stats(agent: MarketingAgent = Depends(get_agent)):
+    """Per-node runs, failures, timeouts and resumes, and checkpoint usage"""
+    return agent.pipeline.stats()
+
+
+@app.get("/admission", response_model=dict)
+async def admission_stats(agent: MarketingAgent = Depends(get_agent)):
+    return {"gemini": agent.llm_admission.stats()}
+
+
+@app.get("/ratelimits", response_model=dict)
+async def rate_limit_stats(agent: MarketingAgent = Depends(get_agent)):
+    return {"search": agent.search_limiter.stats(), "llm": agent.llm_limiter.stats()}
+
+
+@app.get("/resilience", response_model=dict)
+async def resilience_stats(agent: MarketingAgent = Depends(get_agent)):
+    return {"search": agent.search_resilience.stats(), "llm": agent.llm_resilience.stats()}
+
+
+def _bypass_cache(request: AnalyzeRequest, http_request: Request) -> bool:
+    """Honour the body flag and the standard Cache-Control request header"""
+    cache_control = http_request.headers.get("cache-control", "").lower()
+    return request.no_cache or "no-cache" in cache_control or "no-store" in cache_control
+
+
 @app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_marketing(request: AnalyzeRequest):
-    logger.info(f"Analyzing: {request.prompt[:50]}...")
+async def analyze_marketing(
+    request: AnalyzeRequest,
+    http_request: Request,
+    agent: MarketingAgent = Depends(get_agent)
+):
+    logger.info("Analyzing: %.50s...", request.prompt)
     
     try:
-        result = await asyncio.wait_for(
-            agent.run(request.prompt, max_results=request.max_results),
-            timeout=settings.request_timeout
-        )
+        with request_deadline(settings.request_timeout):
+            result = await cancel_on_disconnect(
+                http_request,
+                asyncio.wait_for(
+                    agent.run(
+                        request.prompt,
+                        max_results=request.max_results,
+                        use_cache=not _bypass_cache(request, http_request)
+                    ),
+                    timeout=settings.request_timeout
+                ),
+                "analyze"
+            )
         
-        logger.info(f"Analysis complete: {result.total_insights} insights")
+        logger.info("Analysis complete: %d insights", result.total_insights)
+        if not request.include_timings:
+            result = result.model_copy(update={"timings": None})
         return result
         
-    except asyncio.TimeoutError:
-        logger.error("Request timeout")
+    except (OverloadedError, ClientDisconnected):
+        raise
+    except asyncio.TimeoutError as e:
+        TIMEOUTS.inc("analyze")
+        logger.error("Request timeout: %s", e)
         raise HTTPException(
             status_code=504,
-            detail=f"Request timeout after {settings.request_timeout}s"
+            detail=str(e) or f"Request timeout after {settings.request_timeout}s"
         )
     except Exception as e:
-        logger.error(f"Analysis failed: {e}", exc_info=True)
+        logger.error("Analysis failed: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Analysis failed: {str(e)}"
         )
 
 
+
+@app.post("/analyze/batch", response_model=BatchAnalyzeResponse)
+async def analyze_marketing_batch(
+    batch: BatchAnalyzeRequest,
+    http_request: Request,
+    batch_runner: BatchRunner = Depends(get_batch_runner)
+):
+    """Run many analyses with bounded concurrency; per-item failures are reported, not raised"""
+    if len(batch.requests) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch.requests)} items (max {settings.batch_max_items})"
+        )
+    logger.info("Batch analysis: %d items, concurrency %d", len(batch.requests), batch.concurrency)
+    results = batch_runner.run(batch.requests, batch.concurrency)
+    
+    if batch.stream:
+        async def lines():
+            # aclosing: on disconnect the runner cancels items still in flight now, not at GC
+            try:
+                async with aclosing(results):
+                    async for outcome in results:
+                        yield outcome.model_dump_json() + "\n"
+            except asyncio.CancelledError:
+                CLIENT_DISCONNECTS.inc("analyze_batch_stream")
+                logger.info("Client disconnected; cancelling analyze_batch_stream")
+                raise
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    ordered, elapsed = await cancel_on_disconnect(
+        http_request, collect_ordered(results, len(batch.requests)), "analyze_batch"
+    )
+    succeeded = sum(1 for outcome in ordered if outcome.status == "ok")
+    return BatchAnalyzeResponse(
+        results=ordered,
+        total=len(ordered),
+        succeeded=succeeded,
+        failed=len(ordered) - succeeded,
+        processing_time=round(elapsed, 2)
+    )
+
+
+@app.get("/analyze/batch/stats", response_model=dict)
+async def batch_stats(batch_runner: BatchRunner = Depends(get_batch_runner)):
+    return batch_runner.stats()
+
+
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(
+    request: AnalyzeRequest,
+    http_request: Request,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """Queue an analysis and return its job ID immediately"""
+    if _bypass_cache(request, http_request):
+        request = request.model_copy(update={"no_cache": True})
+    job = await job_queue.submit(request)
+    logger.info("Queued job %s: %.50s...", job.id, request.prompt)
+    return JobSubmitResponse(job_id=job.id, status=job.status, created_at=job.created_at)
+
+
+@app.get("/jobs", response_model=dict)
+async def job_stats(job_queue: JobQueue = Depends(get_job_queue)):
+    return job_queue.stats()
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str, job_queue: JobQueue = Depends(get_job_queue)):
+    status = await job_queue.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    return status
+
+
+@app.get("/history", response_model=HistoryResponse)
+async def analysis_history(
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    history: AnalysisStore = Depends(get_history)
+):
+    """Past analyses, newest first"""
+    # One extra row tells whether there is a next page
+    items = await history.history(limit + 1, offset)
+    return HistoryResponse(
+        items=items[:limit],
+        next_offset=offset + limit if len(items) > limit else None
+    )
+
+
+@app.get("/history/stats", response_model=dict)
+async def history_stats(history: AnalysisStore = Depends(get_history)):
+    return history.stats()
+
+
+@app.get("/search", response_model=InsightSearchResponse)
+async def search_insights(
+    q: Optional[str] = Query(None, max_length=500, description="Full-text query over insight titles and details"),
+    category: Optional[str] = Query(None, max_length=50),
+    min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    max_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    history: AnalysisStore = Depends(get_history)
+):
+    """Past insights matching every given filter; best text match first, else newest first"""
+    items = await history.search(q, category, min_confidence, max_confidence, limit + 1, offset)
+    return InsightSearchResponse(
+        items=items[:limit],
+        next_offset=offset + limit if len(items) > limit else None
+    )
+
+
+def _sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/analyze/stream")
+async def analyze_marketing_stream(
+    request: AnalyzeRequest,
+    http_request: Request,
+    agent: MarketingAgent = Depends(get_agent)
+):
+    """Stream sources, then each insight, as Server-Sent Events"""
+    logger.info("Streaming analysis: %.50s...", request.prompt)
+    use_cache = not _bypass_cache(request, http_request)
+    
+    async def events():
+        deadline = time.monotonic() + settings.request_timeout
+        stream = agent.stream(request.prompt, max_results=request.max_results, use_cache=use_cache)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    # wait_for runs each step in a task that copies the deadline context
+                    with request_deadline(remaining):
+                        event, payload = await asyncio.wait_for(stream.__anext__(), timeout=max(remaining, 0))
+                except StopAsyncIteration:
+                    break
+                
+                if event == "sources":
+                    yield _sse("sources", [source.model_dump(mode="json") for source in payload])
+                elif event == "insight":
+                    yield _sse("insight", payload.model_dump(mode="json"))
+                elif event == "done":
+                    exclude = {"insights", "sources"} if request.include_timings else {"insights", "sources", "timings"}
+                    yield _sse("done", payload.model_dump(mode="json", exclude=exclude))
+        except OverloadedError as e:
+            logger.warning("Rejected stream: %s", e)
+            yield _sse("error", {"detail": str(e)})
+        except asyncio.CancelledError:
+            # StreamingResponse cancels the generator when the client disconnects
+            CLIENT_DISCONNECTS.inc("analyze_stream")
+            logger.info("Client disconnected; cancelling analyze_stream")
+            raise
+        except asyncio.TimeoutError as e:
+            TIMEOUTS.inc("analyze_stream")
+            logger.error("Stream timeout: %s", e)
+            yield _sse("error", {"detail": str(e) or f"Request timeout after {settings.request_timeout}s"})
+        except Exception as e:
+            logger.error("Streaming analysis failed: %s", e, exc_info=True)
+            yield _sse("error", {"detail": f"Analysis failed: {str(e)}"})
+        finally:
+            await stream.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Several workers need the app as an import string; see gunicorn.conf.py for production
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, workers=settings.web_workers)
\ No newline at end of file
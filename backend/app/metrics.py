@@ -0,0 +1,238 @@
+# backend/app/metrics.py
+## Minimal Prometheus metrics registry (text exposition format 0.0.4).
+## Counters and histograms are updated on the request path; collectors are
+## callbacks that report existing component stats (pool, caches, limiters)
+## as gauges at scrape time, so nothing is counted twice.
+
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing counter with optional labels"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = tuple(str(label) for label in labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(tuple(str(label) for label in labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (seconds by convention)"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        key = tuple(str(label) for label in labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * len(self.buckets)
+            self._sums[key] = 0.0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self._sums[key] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(self._sums[labels])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+# A collector returns (name, documentation, type, {labels: value}) families
+Family = Tuple[str, str, str, Dict[Tuple[Tuple[str, str], ...], float]]
+Collector = Callable[[], List[Family]]
+
+
+class Registry:
+    """Holds metrics and scrape-time collectors and renders them as text"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Collector] = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def clear_collectors(self):
+        self._collectors.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+
+        for collector in self._collectors:
+            for name, documentation, metric_type, values in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in sorted(values.items()):
+                    names = [k for k, _ in labels]
+                    label_values = [v for _, v in labels]
+                    lines.append(f"{name}{_format_labels(names, label_values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "marketing_agent_stage_seconds",
+    "Time spent in each analysis pipeline stage",
+    ["stage"],
+))
+ANALYZE_SECONDS = REGISTRY.register(Histogram(
+    "marketing_agent_analysis_seconds",
+    "End-to-end time of uncached analyses",
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "marketing_agent_http_request_seconds",
+    "HTTP request latency by route and status",
+    ["method", "path", "status"],
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "marketing_agent_upstream_errors",
+    "Failed calls to upstream providers",
+    ["provider"],
+))
+FALLBACKS = REGISTRY.register(Counter(
+    "marketing_agent_fallbacks",
+    "Analyses that fell back to a degraded result",
+    ["reason"],
+))
+TIMEOUTS = REGISTRY.register(Counter(
+    "marketing_agent_timeouts",
+    "Requests that hit request_timeout",
+    ["endpoint"],
+))
+CLIENT_DISCONNECTS = REGISTRY.register(Counter(
+    "marketing_agent_client_disconnects",
+    "Requests whose client went away before the response was ready",
+    ["endpoint"],
+))
+CANCELLED_UPSTREAM = REGISTRY.register(Counter(
+    "marketing_agent_cancelled_upstream_calls",
+    "Upstream calls cut short (in_flight) or never made (skipped) because nobody was waiting for the result",
+    ["provider", "stage"],
+))
+PIPELINE_NODES = REGISTRY.register(Counter(
+    "marketing_agent_pipeline_nodes",
+    "Analysis pipeline node runs by outcome (ok, failed, timeout, resumed from a checkpoint)",
+    ["node", "outcome"],
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "marketing_agent_cache_requests",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+))
+SEMANTIC_SIMILARITY = REGISTRY.register(Histogram(
+    "marketing_agent_semantic_cache_similarity",
+    "Similarity of the nearest cached prompt per semantic cache lookup",
+    ["lookup"],
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.99),
+))
+LLM_TOKENS = REGISTRY.register(Histogram(
+    "marketing_agent_llm_tokens",
+    "Tokens per LLM call (prompt and completion)",
+    ["kind"],
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+))
+CONTEXT_SOURCES = REGISTRY.register(Counter(
+    "marketing_agent_context_sources",
+    "Search results used, truncated or dropped to fit the prompt token budget",
+    ["outcome"],
+))
+RETRIES = REGISTRY.register(Counter(
+    "marketing_agent_upstream_retries",
+    "Upstream calls retried after a transient failure",
+    ["provider"],
+))
+HEDGED_REQUESTS = REGISTRY.register(Counter(
+    "marketing_agent_hedged_requests",
+    "Hedged second requests sent, and how many of them finished first",
+    ["provider", "outcome"],
+))
+BREAKER_TRANSITIONS = REGISTRY.register(Counter(
+    "marketing_agent_circuit_breaker_transitions",
+    "Circuit breaker state changes",
+    ["provider", "state"],
+))
+JOB_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "marketing_agent_job_wait_seconds",
+    "Time /jobs entries spent queued before a worker picked them up",
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0),
+))
+JOB_RUN_SECONDS = REGISTRY.register(Histogram(
+    "marketing_agent_job_run_seconds",
+    "Time workers spent running /jobs entries",
+))
+
+
+def gauge_family(name: str, documentation: str, values: Dict[str, float], label: str) -> Family:
+    """Build a gauge family with one label from a flat stats dict"""
+    return (
+        name,
+        documentation,
+        "gauge",
+        {((label, key),): float(value) for key, value in values.items() if isinstance(value, (int, float))},
+    )
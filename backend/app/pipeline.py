@@ -0,0 +1,292 @@
+# backend/app/pipeline.py
+## Explicit analysis pipeline: named nodes joined by edges, run in order
+## over one typed state object (research -> analysis -> summary for
+## MarketingAgent). Each node has its own timeout and concurrency limit.
+## When a node fails or times out, the state fields the completed nodes
+## produced are checkpointed, so the retry resumes after them instead of
+## repeating e.g. the search. Every node run is recorded in the trace.
+## The streaming path drives the nodes itself (run_node / record), since
+## its analysis step yields insights as they arrive.
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from .cache import LRUCache
+from .config import Settings
+from .metrics import PIPELINE_NODES
+from .resilience import request_deadline
+from .schemas import Insight, Source, ThoughtStep
+from .shared_state import StateBackend, StateBackendError
+
+
+logger = logging.getLogger(__name__)
+
+
+class NodeTimeoutError(asyncio.TimeoutError):
+    """A pipeline node ran past its own timeout; callers treat it as their own timeout"""
+
+
+class AnalysisState:
+    """State shared by the analysis nodes; each node reads earlier fields and fills its own"""
+
+    def __init__(self, key: str, prompt: str, max_results: int):
+        self.key = key
+        self.prompt = prompt
+        self.max_results = max_results
+        # research
+        self.search_results: List[Dict[str, Any]] = []
+        # analysis
+        self.raw_output: Optional[str] = None
+        self.usage: Dict[str, int] = {}
+        # summary
+        self.insights: List[Insight] = []
+        self.sources: List[Source] = []
+        self.trace: List[ThoughtStep] = []
+
+
+# A node reads and updates the state and returns a short note for the trace
+NodeFunction = Callable[[AnalysisState], Awaitable[Optional[str]]]
+
+
+class Node:
+    """One pipeline step with its own timeout, concurrency limit and checkpointed outputs"""
+
+    def __init__(
+        self,
+        name: str,
+        run: NodeFunction,
+        outputs: Sequence[str] = (),
+        timeout: Optional[float] = None,
+        concurrency: int = 0
+    ):
+        self.name = name
+        self.run = run
+        self.outputs = tuple(outputs)
+        self.timeout = timeout or None
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self.in_flight = 0
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.resumed = 0
+
+    async def _call(self, state: AnalysisState) -> Optional[str]:
+        if self._slots is None:
+            return await self.run(state)
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                return await self.run(state)
+            finally:
+                self.in_flight -= 1
+
+    async def execute(self, state: AnalysisState) -> Optional[str]:
+        """Run the node under its timeout; the timeout also bounds upstream retries inside it"""
+        self.runs += 1
+        if self.timeout is None:
+            return await self._call(state)
+        start = time.monotonic()
+        try:
+            with request_deadline(self.timeout):
+                return await asyncio.wait_for(self._call(state), self.timeout)
+        except asyncio.TimeoutError:
+            # An upstream call's own timeout inside the node is not the node's
+            if time.monotonic() - start < self.timeout:
+                raise
+            raise NodeTimeoutError(f"{self.name} timed out after {self.timeout}s") from None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "resumed": self.resumed,
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+        }
+
+
+class CheckpointStore:
+    """Outputs of completed nodes per analysis key, kept for `ttl` so a retry can resume.
+
+    Only a run that fails, times out or is cancelled writes a checkpoint;
+    the successful retry clears it. In multi-worker mode checkpoints also go
+    to the shared state backend, so the retry may land on any worker.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, shared: Optional[StateBackend] = None):
+        self.memory = LRUCache(max_entries, ttl)
+        self.shared = shared
+        self.saved = 0
+        self.restored = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings, shared: Optional[StateBackend] = None) -> "CheckpointStore":
+        return cls(settings.pipeline_checkpoint_max_entries, settings.pipeline_checkpoint_ttl, shared)
+
+    async def load(self, key: str) -> Dict[str, Dict[str, Any]]:
+        """Node name -> saved outputs for every node checkpointed under key"""
+        checkpoint = self.memory.get(key)
+        if checkpoint is None and self.shared is not None:
+            try:
+                raw = await self.shared.get(f"checkpoint:{key}")
+            except StateBackendError as e:
+                logger.warning("Shared checkpoints unavailable: %s", e)
+                raw = None
+            if raw is not None:
+                # Written by another worker; keep it here so save() adds to it
+                checkpoint = json.loads(raw)
+                self.memory.set(key, checkpoint)
+        return dict(checkpoint or {})
+
+    async def save(self, key: str, outputs: Dict[str, Dict[str, Any]]):
+        """Add the outputs of some nodes (node name -> outputs) to the checkpoint for key"""
+        checkpoint = {**(self.memory.get(key) or {}), **outputs}
+        self.memory.set(key, checkpoint)
+        self.saved += len(outputs)
+        if self.shared is not None:
+            try:
+                await self.shared.set(f"checkpoint:{key}", json.dumps(checkpoint), self.memory.ttl)
+            except StateBackendError as e:
+                logger.warning("Shared checkpoints unavailable: %s", e)
+
+    async def clear(self, key: str):
+        self.memory.delete(key)
+        if self.shared is not None:
+            try:
+                await self.shared.delete(f"checkpoint:{key}")
+            except StateBackendError:
+                pass  # expires on its own
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.memory),
+            "saved": self.saved,
+            "restored": self.restored,
+        }
+
+
+class Pipeline:
+    """Nodes joined by edges, run from the first node added until one has no outgoing edge"""
+
+    def __init__(self, checkpoints: Optional[CheckpointStore] = None):
+        self.checkpoints = checkpoints
+        self.nodes: Dict[str, Node] = {}
+        self.edges: Dict[str, str] = {}
+        self.entry: Optional[str] = None
+
+    def add_node(self, node: Node) -> "Pipeline":
+        if node.name in self.nodes:
+            raise ValueError(f"Duplicate pipeline node: {node.name}")
+        self.nodes[node.name] = node
+        if self.entry is None:
+            self.entry = node.name
+        return self
+
+    def add_edge(self, source: str, target: str) -> "Pipeline":
+        for name in (source, target):
+            if name not in self.nodes:
+                raise ValueError(f"Unknown pipeline node: {name}")
+        if source in self.edges:
+            raise ValueError(f"Pipeline node {source} already has an outgoing edge")
+        self.edges[source] = target
+        return self
+
+    def order(self) -> List[Node]:
+        """Nodes in execution order"""
+        ordered: List[Node] = []
+        name = self.entry
+        while name is not None:
+            if any(node.name == name for node in ordered):
+                raise ValueError(f"Pipeline has a cycle through {name}")
+            ordered.append(self.nodes[name])
+            name = self.edges.get(name)
+        return ordered
+
+    async def run(self, state: AnalysisState):
+        """Run every node in order, resuming from checkpoints; a failing node's error is raised"""
+        saved = await self.checkpoints.load(state.key) if self.checkpoints is not None else {}
+        completed: List[Node] = []
+        resuming = True
+        try:
+            for node in self.order():
+                # Only a leading run of checkpointed nodes is restored: once a node
+                # runs again, later checkpoints may be stale
+                if resuming and node.outputs and node.name in saved:
+                    self._restore(node, state, saved[node.name])
+                    continue
+                resuming = False
+                await self._run_node(node, state)
+                completed.append(node)
+        except BaseException:
+            # Failed, timed out or cancelled: keep what the completed nodes produced
+            if self.checkpoints is not None:
+                await self._checkpoint(state, completed)
+            raise
+        if saved:
+            await self.checkpoints.clear(state.key)
+
+    async def run_node(self, name: str, state: AnalysisState):
+        """Run a single node under its timeout and concurrency limit, without checkpoints"""
+        await self._run_node(self.nodes[name], state)
+
+    def record(self, name: str, state: AnalysisState, start: float, status: str, note: Optional[str] = None):
+        """Trace a node's work done outside the pipeline, e.g. the streamed LLM call"""
+        node = self.nodes[name]
+        node.runs += 1
+        if status == "failed":
+            node.failures += 1
+        self._record(node, state, start, status, note)
+
+    def _restore(self, node: Node, state: AnalysisState, outputs: Dict[str, Any]):
+        for field, value in outputs.items():
+            setattr(state, field, value)
+        node.resumed += 1
+        self.checkpoints.restored += 1
+        PIPELINE_NODES.inc(node.name, "resumed")
+        state.trace.append(ThoughtStep(node=node.name, status="resumed", duration_ms=0.0, note="Restored from checkpoint"))
+
+    async def _checkpoint(self, state: AnalysisState, completed: List[Node]):
+        checkpoint = {}
+        for node in completed:
+            outputs = {field: getattr(state, field) for field in node.outputs}
+            # Empty outputs (e.g. no search results) usually mean an upstream
+            # problem; the retry should run that node again
+            if any(outputs.values()):
+                checkpoint[node.name] = outputs
+        if checkpoint:
+            await self.checkpoints.save(state.key, checkpoint)
+
+    async def _run_node(self, node: Node, state: AnalysisState):
+        start = time.perf_counter()
+        try:
+            note = await node.execute(state)
+        except NodeTimeoutError as e:
+            node.timeouts += 1
+            self._record(node, state, start, "timeout", str(e))
+            raise
+        except Exception as e:
+            node.failures += 1
+            self._record(node, state, start, "failed", str(e) or type(e).__name__)
+            raise
+        self._record(node, state, start, "ok", note)
+
+    @staticmethod
+    def _record(node: Node, state: AnalysisState, start: float, status: str, note: Optional[str]):
+        PIPELINE_NODES.inc(node.name, status)
+        state.trace.append(ThoughtStep(
+            node=node.name,
+            status=status,
+            duration_ms=round((time.perf_counter() - start) * 1000, 3),
+            note=note
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {node.name: node.stats() for node in self.order()}
+        if self.checkpoints is not None:
+            stats["checkpoints"] = self.checkpoints.stats()
+        return stats
@@ -0,0 +1,402 @@
+# backend/app/providers.py
+## Upstream provider layer behind MarketingAgent.
+## SearchProvider and LLMProvider hide SerpAPI and Gemini behind small async
+## interfaces. The mock implementations are deterministic local stand-ins
+## with configurable latency and failure rates, so the whole /analyze
+## stack can be load-tested without network access or API quota;
+## app/replay.py records real exchanges and plays them back.
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+from .config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "max_output_tokens": 2048,
+}
+
+INSIGHT_CATEGORIES = ["Strategy", "Channels", "Content", "Analytics", "Audience", "ROI", "Tools"]
+
+# Response schema for Gemini structured output: the model returns bare JSON
+INSIGHTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "insights": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "detail": {"type": "string"},
+                    "confidence": {"type": "number"},
+                    "category": {"type": "string", "enum": INSIGHT_CATEGORIES},
+                },
+                "required": ["title", "detail", "confidence", "category"],
+            },
+        },
+    },
+    "required": ["insights"],
+}
+
+STRUCTURED_GENERATION_CONFIG = {
+    **GENERATION_CONFIG,
+    "response_mime_type": "application/json",
+    "response_schema": INSIGHTS_SCHEMA,
+}
+
+
+class Completion:
+    """Completion text plus the token counts the provider reported (None when unknown)"""
+
+    def __init__(self, text: str, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class ProviderError(Exception):
+    """Raised by a provider when the upstream call fails"""
+
+    # Transient by default; see resilience.is_retryable
+    retryable = True
+
+
+class RateLimitedError(ProviderError):
+    """Raised when the upstream rejects a call with 429 / quota exhausted"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds"""
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class SearchProvider(ABC):
+    """Web search backend returning [{"title", "url", "snippet"}, ...]"""
+
+    name = "search"
+    engine = "default"
+
+    @abstractmethod
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        """Return up to num_results results; raise on upstream errors"""
+
+    async def aclose(self):
+        pass
+
+
+class LLMProvider(ABC):
+    """Text generation backend"""
+
+    name = "llm"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> Completion:
+        """Return the full completion"""
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion text in chunks as it is produced"""
+
+    async def aclose(self):
+        pass
+
+
+class SerpAPISearchProvider(SearchProvider):
+    """Google results via SerpAPI over the shared pooled HTTP client"""
+
+    name = "serpapi"
+
+    def __init__(self, api_key: str, engine: str, get_client: Callable[[], httpx.AsyncClient]):
+        self.api_key = api_key
+        self.engine = engine
+        self.get_client = get_client
+
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        client = self.get_client()
+        response = await asyncio.wait_for(
+            client.get(
+                "https://serpapi.com/search",
+                params={
+                    "q": query,
+                    "api_key": self.api_key,
+                    "num": num_results,
+                    "engine": self.engine
+                }
+            ),
+            timeout=30.0
+        )
+
+        if response.status_code == 429:
+            raise RateLimitedError("SerpAPI rate limit exceeded", _retry_after(response.headers.get("retry-after")))
+        if response.status_code != 200:
+            logger.warning("SerpAPI error: %d", response.status_code)
+            response.raise_for_status()
+
+        data = response.json()
+        results = []
+
+        for result in data.get("organic_results", [])[:num_results]:
+            results.append({
+                "title": result.get("title", ""),
+                "url": result.get("link", ""),
+                "snippet": result.get("snippet", "")
+            })
+
+        logger.debug("SerpAPI: found %d results", len(results))
+        return results
+
+
+class GeminiLLMProvider(LLMProvider):
+    """Google Gemini via the google-generativeai SDK.
+
+    Uses the SDK's native async API by default; with use_async=False the
+    blocking API runs on a dedicated bounded thread pool instead.
+    """
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        use_async: bool = True,
+        max_workers: int = 16,
+        structured_output: bool = True
+    ):
+        import google.generativeai as genai
+        from google.api_core.exceptions import ResourceExhausted
+
+        self._rate_limited = ResourceExhausted
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.generation_config = STRUCTURED_GENERATION_CONFIG if structured_output else GENERATION_CONFIG
+        self.executor: Optional[ThreadPoolExecutor] = None
+        if not use_async:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+
+    async def generate(self, prompt: str) -> Completion:
+        try:
+            if self.executor is None:
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=self.generation_config
+                )
+            else:
+                loop = asyncio.get_running_loop()
+                # Cancelling this await drops a call still queued for a thread; one
+                # already running can't be interrupted and its result is discarded
+                response = await loop.run_in_executor(
+                    self.executor,
+                    lambda: self.model.generate_content(
+                        prompt,
+                        generation_config=self.generation_config
+                    )
+                )
+        except self._rate_limited as e:
+            raise RateLimitedError(f"Gemini quota exceeded: {e}") from e
+        usage = getattr(response, "usage_metadata", None)
+        return Completion(
+            response.text,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            completion_tokens=getattr(usage, "candidates_token_count", None)
+        )
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self.generation_config,
+                stream=True
+            )
+            async for chunk in response:
+                yield chunk.text
+        except self._rate_limited as e:
+            raise RateLimitedError(f"Gemini quota exceeded: {e}") from e
+
+    async def aclose(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LatencyModel:
+    """Seeded latency sampler: fixed, uniform (±50%) or lognormal around a median"""
+
+    def __init__(self, median_ms: float, distribution: str = "lognormal", sigma: float = 0.5, seed: int = 0):
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.median_ms = median_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+
+    def sample(self) -> float:
+        """Return one latency draw in seconds"""
+        if self.distribution == "fixed":
+            ms = self.median_ms
+        elif self.distribution == "uniform":
+            ms = self._rng.uniform(0.5 * self.median_ms, 1.5 * self.median_ms)
+        else:
+            ms = self._rng.lognormvariate(math.log(max(self.median_ms, 1e-3)), self.sigma)
+        return ms / 1000.0
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class MockSearchProvider(SearchProvider):
+    """Deterministic offline search results; content depends only on the query"""
+
+    name = "mock-search"
+    engine = "mock"
+
+    def __init__(self, latency: LatencyModel, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        await asyncio.sleep(self.latency.sample())
+        if self._rng.random() < self.failure_rate:
+            raise ProviderError("mock search failure")
+
+        digest = _digest(query)[:12]
+        return [
+            {
+                "title": f"{query[:60]} - result {i + 1}",
+                "url": f"https://example.com/{digest}/{i + 1}",
+                "snippet": f"Mock snippet {i + 1} about {query[:120]}. Market data point {int(digest[i % 12], 16) * 7}%."
+            }
+            for i in range(num_results)
+        ]
+
+
+class MockLLMProvider(LLMProvider):
+    """Deterministic offline LLM returning well-formed insight JSON"""
+
+    name = "mock-llm"
+
+    CATEGORIES = INSIGHT_CATEGORIES
+
+    def __init__(
+        self,
+        latency: LatencyModel,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        num_insights: int = 5,
+        chunk_chars: int = 64,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.num_insights = num_insights
+        self.chunk_chars = chunk_chars
+        self._rng = random.Random(seed)
+
+    def completion(self, prompt: str) -> str:
+        """The fixed completion for a prompt"""
+        digest = _digest(prompt)
+        insights = [
+            {
+                "title": f"Mock insight {i + 1} ({digest[:8]})",
+                "detail": f"Deterministic detail {i + 1} derived from prompt hash {digest[i * 4:i * 4 + 16]}.",
+                "confidence": round(0.7 + (int(digest[i], 16) / 15) * 0.25, 2),
+                "category": self.CATEGORIES[int(digest[i + 1], 16) % len(self.CATEGORIES)]
+            }
+            for i in range(self.num_insights)
+        ]
+        return json.dumps({"insights": insights}, indent=2)
+
+    def _maybe_fail(self):
+        if self._rng.random() < self.failure_rate:
+            raise ProviderError("mock LLM failure")
+
+    async def generate(self, prompt: str) -> Completion:
+        await asyncio.sleep(self.latency.sample())
+        self._maybe_fail()
+        return Completion(self.completion(prompt))
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = self.completion(prompt)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        # Spread the total latency: first chunk pays a third of it (time-to-first-token)
+        total = self.latency.sample()
+        await asyncio.sleep(total / 3)
+        self._maybe_fail()
+        for chunk in chunks:
+            await asyncio.sleep(total * 2 / 3 / len(chunks))
+            yield chunk
+
+
+def create_search_provider(settings: Settings, get_client: Callable[[], httpx.AsyncClient]) -> SearchProvider:
+    """Build the search provider selected by settings.search_provider, recorded or replayed per settings.upstream_mode"""
+    if settings.upstream_mode != "live":
+        from .replay import wrap_search_provider
+        return wrap_search_provider(settings, lambda: _live_search_provider(settings, get_client))
+    return _live_search_provider(settings, get_client)
+
+
+def _live_search_provider(settings: Settings, get_client: Callable[[], httpx.AsyncClient]) -> SearchProvider:
+    if settings.search_provider == "mock":
+        latency = LatencyModel(
+            settings.mock_search_latency_ms,
+            settings.mock_latency_distribution,
+            settings.mock_latency_sigma,
+            seed=settings.mock_seed
+        )
+        return MockSearchProvider(latency, settings.mock_search_failure_rate, seed=settings.mock_seed)
+    if settings.search_provider == "serpapi":
+        if not settings.serpapi_api_key:
+            raise ValueError("SERPAPI_API_KEY is required for the serpapi search provider")
+        return SerpAPISearchProvider(settings.serpapi_api_key, settings.search_engine, get_client)
+    raise ValueError(f"Unknown search provider: {settings.search_provider}")
+
+
+def create_llm_provider(settings: Settings) -> LLMProvider:
+    """Build the LLM provider selected by settings.llm_provider, recorded or replayed per settings.upstream_mode"""
+    if settings.upstream_mode != "live":
+        from .replay import wrap_llm_provider
+        return wrap_llm_provider(settings, lambda: _live_llm_provider(settings))
+    return _live_llm_provider(settings)
+
+
+def _live_llm_provider(settings: Settings) -> LLMProvider:
+    if settings.llm_provider == "mock":
+        latency = LatencyModel(
+            settings.mock_llm_latency_ms,
+            settings.mock_latency_distribution,
+            settings.mock_latency_sigma,
+            seed=settings.mock_seed + 1
+        )
+        return MockLLMProvider(latency, settings.mock_llm_failure_rate, seed=settings.mock_seed + 1)
+    if settings.llm_provider == "gemini":
+        if not settings.google_api_key:
+            raise ValueError("GOOGLE_API_KEY is required for the gemini LLM provider")
+        return GeminiLLMProvider(
+            settings.google_api_key,
+            settings.gemini_model,
+            use_async=settings.gemini_async,
+            max_workers=settings.llm_max_concurrency,
+            structured_output=settings.gemini_structured_output
+        )
+    raise ValueError(f"Unknown LLM provider: {settings.llm_provider}")
@@ -0,0 +1,296 @@
+# backend/app/ratelimit.py
+## Async token-bucket rate limiting for upstream providers.
+## UpstreamLimiter holds the process-wide limits for one provider (requests
+## per minute, tokens per minute, calls per day) and serves waiters by
+## priority, so interactive /analyze traffic goes ahead of batch and /jobs
+## work. On top of that, code that fans out (e.g. a batch) can install
+## extra buckets with scoped_limits(); every upstream call made from that
+## context, including from child tasks, also waits on throttle().
+## With a shared state backend (multi-worker mode) the per-minute limits
+## and the daily quota are also counted across workers.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .admission import OverloadedError
+from .shared_state import StateBackend, StateBackendError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Scheduling priorities; lower values are served first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for TPM accounting (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate_per_minute`, holding at most `burst` tokens.
+
+    Waiters are served by priority, then strictly in arrival order. A request
+    larger than the bucket waits for a full bucket and then overdraws it.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._drainer: Optional[asyncio.Task] = None
+        self.acquired = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0, priority: int = INTERACTIVE):
+        """Wait until `tokens` are available, then take them"""
+        self._refill()
+        if not self._waiters and self.tokens >= min(tokens, self.capacity):
+            self.tokens -= tokens
+            self.acquired += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        self.throttled += 1
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        start = time.monotonic()
+        try:
+            await future
+        finally:
+            self.waited_seconds += time.monotonic() - start
+
+    async def _drain(self):
+        """Hand out tokens to queued waiters as they refill"""
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                # Cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            self._refill()
+            needed = min(tokens, self.capacity)
+            if self.tokens >= needed:
+                heapq.heappop(self._waiters)
+                self.tokens -= tokens
+                self.acquired += 1
+                future.set_result(None)
+            else:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+    def charge(self, tokens: float):
+        """Debit tokens used after the fact (e.g. completion tokens) without waiting"""
+        self._refill()
+        self.tokens -= tokens
+
+    def stats(self) -> Dict[str, float]:
+        self._refill()
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "tokens": round(self.tokens, 2),
+            "queued": len(self._waiters),
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
+
+
+class DailyQuota:
+    """Calls allowed per UTC day; once spent, calls are rejected until midnight"""
+
+    def __init__(self, name: str, limit: int, shared: Optional[StateBackend] = None):
+        self.name = name
+        self.limit = limit
+        self.shared = shared
+        self.day = datetime.utcnow().date()
+        self.used = 0
+        self.rejected = 0
+
+    async def take(self):
+        now = datetime.utcnow()
+        if now.date() != self.day:
+            self.day = now.date()
+            self.used = 0
+        if self.shared is not None:
+            try:
+                # Counted even when rejected; the day's key is gone by the time that matters
+                used = await self.shared.incr(f"ratelimit:{self.name}:day:{self.day.isoformat()}", 1, ttl=2 * 86400)
+            except StateBackendError as e:
+                logger.warning("Shared %s quota unavailable, counting locally: %s", self.name, e)
+                used = self.used + 1
+        else:
+            used = self.used + 1
+        if used > self.limit:
+            self.rejected += 1
+            midnight = datetime.combine(self.day + timedelta(days=1), datetime.min.time())
+            raise OverloadedError(self.name, "daily quota exhausted", retry_after=(midnight - now).total_seconds())
+        self.used = used
+
+
+class SharedWindow:
+    """Per-minute limit counted in the shared state backend, so all workers draw on one budget.
+
+    Uses fixed one-minute windows: a call that would go over waits for the
+    next window. The local TokenBucket in front still smooths each worker.
+    """
+
+    def __init__(self, backend: StateBackend, key: str, per_minute: float):
+        self.backend = backend
+        self.key = key
+        self.per_minute = per_minute
+        self.waits = 0
+
+    async def acquire(self, amount: int = 1):
+        while True:
+            now = time.time()
+            window = int(now // 60)
+            used = await self.backend.incr(f"{self.key}:{window}", amount, ttl=120)
+            # An oversize call goes through alone rather than never
+            if used <= self.per_minute or used == amount:
+                return
+            self.waits += 1
+            # Jitter so workers don't all retry at the top of the minute
+            await asyncio.sleep((window + 1) * 60 - now + random.uniform(0, 1))
+
+    async def charge(self, amount: int):
+        await self.backend.incr(f"{self.key}:{int(time.time() // 60)}", amount, ttl=120)
+
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Schedule upstream calls made in this context (and its child tasks) at `level`"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class UpstreamLimiter:
+    """Process-wide limits for one provider; any limit set to 0 is disabled"""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float = 0,
+        tpm: float = 0,
+        daily_quota: int = 0,
+        shared: Optional[StateBackend] = None
+    ):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        # Allow a second's worth of tokens in one go, at least one typical prompt
+        self.tokens = TokenBucket(tpm, burst=max(tpm / 60.0, 4096.0)) if tpm > 0 else None
+        self.quota = DailyQuota(name, daily_quota, shared) if daily_quota > 0 else None
+        self.shared_requests = SharedWindow(shared, f"ratelimit:{name}:rpm", rpm) if shared and rpm > 0 else None
+        self.shared_tokens = SharedWindow(shared, f"ratelimit:{name}:tpm", tpm) if shared and tpm > 0 else None
+        self.shared = shared
+        self._background: Set[asyncio.Task] = set()
+        self.shared_errors = 0
+        self.paused_until = 0.0
+        self.backoffs = 0
+
+    async def acquire(self, tokens: int = 0):
+        """Wait for capacity for one call of about `tokens` input tokens"""
+        if self.quota is not None:
+            await self.quota.take()
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        level = _priority.get()
+        if self.requests is not None:
+            await self.requests.acquire(1, level)
+        if self.tokens is not None and tokens:
+            await self.tokens.acquire(tokens, level)
+        try:
+            if self.shared_requests is not None:
+                await self.shared_requests.acquire(1)
+            if self.shared_tokens is not None and tokens:
+                await self.shared_tokens.acquire(tokens)
+        except StateBackendError as e:
+            # Fail open: the local buckets still apply
+            self.shared_errors += 1
+            logger.warning("Shared %s rate limit unavailable: %s", self.name, e)
+
+    def charge(self, tokens: int):
+        """Account for tokens only known after the call (the completion)"""
+        if self.tokens is not None and tokens:
+            self.tokens.charge(tokens)
+        if self.shared_tokens is not None and tokens:
+            task = asyncio.ensure_future(self._charge_shared(tokens))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _charge_shared(self, tokens: int):
+        try:
+            await self.shared_tokens.charge(tokens)
+        except StateBackendError as e:
+            self.shared_errors += 1
+            logger.warning("Shared %s rate limit unavailable: %s", self.name, e)
+
+    def backoff(self, seconds: float):
+        """Stop admitting calls for `seconds` after an upstream 429"""
+        self.backoffs += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {"backoffs": self.backoffs}
+        for prefix, bucket in (("rpm", self.requests), ("tpm", self.tokens)):
+            if bucket is not None:
+                stats.update({f"{prefix}_{key}": value for key, value in bucket.stats().items()})
+        if self.quota is not None:
+            stats.update({
+                "daily_quota": self.quota.limit,
+                "daily_used": self.quota.used,
+                "daily_rejected": self.quota.rejected,
+            })
+        for prefix, window in (("shared_rpm", self.shared_requests), ("shared_tpm", self.shared_tokens)):
+            if window is not None:
+                stats[f"{prefix}_waits"] = window.waits
+        if self.shared is not None:
+            stats["shared_errors"] = self.shared_errors
+        return stats
+
+
+_scoped: ContextVar[Dict[str, TokenBucket]] = ContextVar("scoped_rate_limits", default={})
+
+
+@contextmanager
+def scoped_limits(**buckets: TokenBucket) -> Iterator[None]:
+    """Apply per-provider buckets (e.g. search=..., llm=...) to calls made in this context"""
+    token = _scoped.set({**_scoped.get(), **buckets})
+    try:
+        yield
+    finally:
+        _scoped.reset(token)
+
+
+async def throttle(provider: str):
+    """Wait for the scoped bucket of `provider`, if any"""
+    bucket = _scoped.get().get(provider)
+    if bucket is not None:
+        await bucket.acquire(priority=_priority.get())
@@ -0,0 +1,323 @@
+# backend/app/replay.py
+## Record/replay of upstream calls for offline performance work.
+## With UPSTREAM_MODE=record the live SerpAPI and Gemini providers are
+## wrapped so every exchange (request, response or error, and the observed
+## latency) is appended to a cassette: gzip-compressed JSON lines keyed by
+## a hash of the request. With UPSTREAM_MODE=replay the cassette stands in
+## for both providers, optionally re-injecting the recorded latencies, so
+## the full /analyze pipeline (prompt building, JSON extraction, Insight
+## validation) runs against real-world payloads with no network or quota.
+##
+## Record with a single worker: each worker would append its own gzip
+## stream to the same file.
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .config import Settings
+from .providers import Completion, LLMProvider, ProviderError, RateLimitedError, SearchProvider
+from .resilience import is_retryable
+
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMissError(ProviderError):
+    """Replay found no recording for a request"""
+
+    # A retry can't find it either
+    retryable = False
+
+
+def request_key(kind: str, **request: Any) -> str:
+    """Stable hash of one upstream request"""
+    canonical = json.dumps({"kind": kind, **request}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def _error_entry(exc: Exception) -> Dict[str, Any]:
+    """What replay needs to raise an equivalent error"""
+    return {
+        "type": type(exc).__name__,
+        "message": str(exc),
+        "retryable": is_retryable(exc),
+        "retry_after": getattr(exc, "retry_after", None),
+    }
+
+
+def _raise_recorded(error: Dict[str, Any]):
+    if error["type"] == "RateLimitedError":
+        raise RateLimitedError(error["message"], error.get("retry_after"))
+    if error["type"] == "TimeoutError":
+        raise asyncio.TimeoutError(error["message"])
+    exc = ProviderError(f"{error['type']}: {error['message']}")
+    # Retried (and counted by the breaker) only if the live error was
+    exc.retryable = error.get("retryable", True)
+    raise exc
+
+
+class Cassette:
+    """Recorded interactions in one gzip-compressed JSON-lines file, indexed by request hash.
+
+    Requests recorded more than once (e.g. a failure and its retry) are
+    replayed in recorded order, wrapping around. Recording hands each line
+    to a writer thread, so compression and disk I/O stay off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursors: Dict[str, int] = {}
+        self._pending: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Read the cassette into memory; a truncated tail (recording still open, or a crash) is ignored"""
+        index: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    index.setdefault(entry["key"], []).append(entry)
+        except FileNotFoundError:
+            logger.warning("Cassette %s not found; every upstream call will miss", self.path)
+        except (EOFError, OSError, zlib.error, ValueError) as e:
+            # A recording that crashed mid-write, possibly appended to later,
+            # leaves a truncated or corrupt gzip member
+            logger.warning("Cassette %s is truncated or corrupt (%s); using the %d requests read before it",
+                           self.path, e, len(index))
+        self._index = index
+        logger.info("Loaded %d recorded requests from %s", len(index), self.path)
+        return index
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """The next recorded entry for key; loads the file first unless load() already ran (the app preloads it)"""
+        index = self._index if self._index is not None else self.load()
+        entries = index.get(key)
+        if not entries:
+            self.misses += 1
+            return None
+        cursor = self._cursors.get(key, 0)
+        self._cursors[key] = cursor + 1
+        self.replayed += 1
+        return entries[cursor % len(entries)]
+
+    def record(self, key: str, kind: str, request: Dict[str, Any], latency: float, **outcome: Any):
+        entry = {"key": key, "kind": kind, "request": request, "latency": round(latency, 6), **outcome}
+        # Serialized now: the caller may go on to modify what it got back
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_lines, name="cassette-writer", daemon=True)
+            self._writer.start()
+        self._pending.put(line)
+        self.recorded += 1
+
+    def _write_lines(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Appending starts a new gzip member; readers see all members as one stream
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            while True:
+                line = self._pending.get()
+                if line is None:
+                    return
+                f.write(line)
+                # Flushed whenever the queue runs dry, so a crash loses little
+                if self._pending.empty():
+                    f.flush()
+
+    def close(self):
+        """Write everything recorded so far and close the file; blocks until done"""
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": len(self._index) if self._index is not None else 0,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def open_cassette(path: str) -> Cassette:
+    """The process-wide Cassette for path, so search and LLM share one file"""
+    cassette = _cassettes.get(path)
+    if cassette is None:
+        cassette = _cassettes[path] = Cassette(path)
+    return cassette
+
+
+class RecordingSearchProvider(SearchProvider):
+    """Live search provider whose calls are appended to a cassette"""
+
+    def __init__(self, inner: SearchProvider, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.name = inner.name
+        self.engine = inner.engine
+
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        request = {"query": query, "num_results": num_results, "engine": self.engine}
+        key = request_key("search", **request)
+        start = time.perf_counter()
+        try:
+            results = await self.inner.search(query, num_results)
+        except Exception as e:
+            self.cassette.record(key, "search", request, time.perf_counter() - start, error=_error_entry(e))
+            raise
+        self.cassette.record(key, "search", request, time.perf_counter() - start, results=results)
+        return results
+
+    async def aclose(self):
+        await self.inner.aclose()
+        await asyncio.to_thread(self.cassette.close)
+
+
+class RecordingLLMProvider(LLMProvider):
+    """Live LLM provider whose completions (and stream chunk timing) are appended to a cassette"""
+
+    def __init__(self, inner: LLMProvider, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.name = inner.name
+
+    async def generate(self, prompt: str) -> Completion:
+        request = {"prompt": prompt}
+        key = request_key("llm", **request)
+        start = time.perf_counter()
+        try:
+            completion = await self.inner.generate(prompt)
+        except Exception as e:
+            self.cassette.record(key, "llm", request, time.perf_counter() - start, error=_error_entry(e))
+            raise
+        self.cassette.record(
+            key, "llm", request, time.perf_counter() - start,
+            text=completion.text,
+            prompt_tokens=completion.prompt_tokens,
+            completion_tokens=completion.completion_tokens
+        )
+        return completion
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        request = {"prompt": prompt}
+        key = request_key("llm", **request)
+        start = last = time.perf_counter()
+        chunks: List[List[Any]] = []
+        try:
+            async for chunk in self.inner.stream(prompt):
+                now = time.perf_counter()
+                chunks.append([round(now - last, 6), chunk])
+                last = now
+                yield chunk
+        except Exception as e:
+            self.cassette.record(key, "llm", request, time.perf_counter() - start, error=_error_entry(e))
+            raise
+        # Only complete streams are recorded; a consumer that stopped early
+        # (GeneratorExit) leaves nothing a replay could use
+        self.cassette.record(
+            key, "llm", request, time.perf_counter() - start,
+            text="".join(chunk for _, chunk in chunks),
+            chunks=chunks
+        )
+
+    async def aclose(self):
+        await self.inner.aclose()
+        await asyncio.to_thread(self.cassette.close)
+
+
+class ReplaySearchProvider(SearchProvider):
+    """Serves recorded search results, sleeping for the recorded latency times `latency_scale`"""
+
+    name = "replay-search"
+
+    def __init__(self, cassette: Cassette, engine: str, latency_scale: float = 1.0):
+        self.cassette = cassette
+        self.engine = engine
+        self.latency_scale = latency_scale
+
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        key = request_key("search", query=query, num_results=num_results, engine=self.engine)
+        entry = self.cassette.lookup(key)
+        if entry is None:
+            raise CassetteMissError(f"No recorded {self.engine} search for {query[:80]!r} (num_results={num_results})")
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+        if "error" in entry:
+            _raise_recorded(entry["error"])
+        return entry["results"]
+
+
+class ReplayLLMProvider(LLMProvider):
+    """Serves recorded completions; streams replay the recorded chunk timing when there is one"""
+
+    name = "replay-llm"
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 1.0):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+
+    def _lookup(self, prompt: str) -> Dict[str, Any]:
+        entry = self.cassette.lookup(request_key("llm", prompt=prompt))
+        if entry is None:
+            raise CassetteMissError(f"No recorded completion for a {len(prompt)}-char prompt")
+        return entry
+
+    async def _sleep(self, seconds: float):
+        if self.latency_scale > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+
+    async def generate(self, prompt: str) -> Completion:
+        entry = self._lookup(prompt)
+        await self._sleep(entry["latency"])
+        if "error" in entry:
+            _raise_recorded(entry["error"])
+        return Completion(entry["text"], entry.get("prompt_tokens"), entry.get("completion_tokens"))
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        entry = self._lookup(prompt)
+        if "error" in entry:
+            await self._sleep(entry["latency"])
+            _raise_recorded(entry["error"])
+        # A completion recorded by generate() streams as one chunk
+        for delay, chunk in entry.get("chunks") or [[entry["latency"], entry["text"]]]:
+            await self._sleep(delay)
+            yield chunk
+
+
+def wrap_search_provider(settings: Settings, build_live: Callable[[], SearchProvider]) -> SearchProvider:
+    """Search provider for settings.upstream_mode record or replay"""
+    cassette = open_cassette(settings.cassette_path)
+    if settings.upstream_mode == "record":
+        return RecordingSearchProvider(build_live(), cassette)
+    if settings.upstream_mode == "replay":
+        return ReplaySearchProvider(cassette, settings.search_engine, settings.replay_latency_scale)
+    raise ValueError(f"Unknown upstream mode: {settings.upstream_mode}")
+
+
+def wrap_llm_provider(settings: Settings, build_live: Callable[[], LLMProvider]) -> LLMProvider:
+    """LLM provider for settings.upstream_mode record or replay"""
+    cassette = open_cassette(settings.cassette_path)
+    if settings.upstream_mode == "record":
+        return RecordingLLMProvider(build_live(), cassette)
+    if settings.upstream_mode == "replay":
+        return ReplayLLMProvider(cassette, settings.replay_latency_scale)
+    raise ValueError(f"Unknown upstream mode: {settings.upstream_mode}")
@@ -0,0 +1,113 @@
+# backend/app/research.py
+## Research stage helpers: expand a marketing prompt into sub-queries, then
+## merge the per-query search results into one ranked, de-duplicated list.
+## Results are deduped by canonical URL and by near-duplicate snippet, and
+## ranked with reciprocal-rank fusion so pages found by several sub-queries
+## rise to the top.
+
+import re
+from typing import Any, Dict, List, Sequence, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# Sub-query templates keyed by facet name (see Settings.research_facets)
+FACET_TEMPLATES = {
+    "trends": "{topic} market trends",
+    "competitors": "{topic} competitors",
+    "pricing": "{topic} pricing",
+    "audience": "{topic} target audience",
+    "channels": "{topic} marketing channels",
+    "statistics": "{topic} statistics",
+}
+
+# Words kept from the prompt when building sub-queries
+TOPIC_WORDS = 12
+
+# Query parameters that only track clicks and never change the page
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid"}
+
+# Weight of the user's own query relative to a generated sub-query
+PRIMARY_WEIGHT = 1.5
+RRF_K = 60
+
+_WORD = re.compile(r"\w+")
+
+
+def expand_queries(prompt: str, facets: Sequence[str]) -> List[str]:
+    """Return the prompt itself followed by one sub-query per known facet"""
+    topic = " ".join(prompt.split()[:TOPIC_WORDS])
+    queries = [prompt]
+    for facet in facets:
+        template = FACET_TEMPLATES.get(facet)
+        if template is not None:
+            query = template.format(topic=topic)
+            if query not in queries:
+                queries.append(query)
+    return queries
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL so trivially different links to one page compare equal"""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    # http and https copies of a page are the same source
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+
+def _shingles(text: str, size: int = 3) -> Set[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _similar(a: Set[str], b: Set[str], threshold: float) -> bool:
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= threshold
+
+
+def merge_results(
+    result_lists: Sequence[List[Dict[str, Any]]],
+    limit: int,
+    snippet_similarity: float = 0.8
+) -> List[Dict[str, Any]]:
+    """Fuse per-query results (the first list is the user's own query) into one ranked list"""
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, Dict[str, Any]] = {}
+
+    for list_index, results in enumerate(result_lists):
+        weight = PRIMARY_WEIGHT if list_index == 0 else 1.0
+        for rank, result in enumerate(results):
+            url = result.get("url", "")
+            if not url:
+                continue
+            key = canonical_url(url)
+            scores[key] = scores.get(key, 0.0) + weight / (RRF_K + rank + 1)
+            first_seen.setdefault(key, result)
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+
+    merged: List[Dict[str, Any]] = []
+    kept_shingles: List[Set[str]] = []
+    for key in ranked:
+        result = first_seen[key]
+        shingles = _shingles(result.get("snippet", ""))
+        # Syndicated copies of one article show up under different URLs
+        if any(_similar(shingles, kept, snippet_similarity) for kept in kept_shingles):
+            continue
+        merged.append(result)
+        kept_shingles.append(shingles)
+        if len(merged) >= limit:
+            break
+    return merged
@@ -0,0 +1,271 @@
+# backend/app/resilience.py
+## Resilience for upstream calls: bounded retries with decorrelated jitter,
+## optional hedged requests once a call runs past the provider's recent
+## latency percentile, and a circuit breaker that fails fast while the
+## provider keeps failing. Retry sleeps and hedges never outlast the
+## caller's deadline (request_deadline), so the request_timeout budget holds.
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional
+
+import httpx
+
+from .admission import OverloadedError
+from .config import Settings
+from .metrics import BREAKER_TRANSITIONS, CANCELLED_UPSTREAM, HEDGED_REQUESTS, RETRIES
+from .providers import ProviderError, RateLimitedError
+
+
+logger = logging.getLogger(__name__)
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("upstream_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """Bound retries and hedges of upstream calls made in this context to `seconds` from now"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class CircuitOpenError(ProviderError):
+    """Raised without calling the provider while its circuit is open"""
+
+
+# google.api_core exceptions for transient Gemini failures, matched by name so
+# the SDK isn't imported here
+TRANSIENT_GOOGLE_ERRORS = {"ServiceUnavailable", "DeadlineExceeded", "ResourceExhausted", "InternalServerError"}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Only known-transient upstream failures are retried and count against the breaker.
+
+    Anything else (a blocked Gemini candidate, bad JSON, a bug) would fail
+    the same way again, so it is raised at once without tripping the breaker.
+    """
+    if isinstance(exc, (OverloadedError, CircuitOpenError)):
+        return False
+    if isinstance(exc, ProviderError):
+        # Raised by our providers (RateLimitedError, mock and replayed failures)
+        return exc.retryable
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return any(
+        cls.__module__.startswith("google.api_core") and cls.__name__ in TRANSIENT_GOOGLE_ERRORS
+        for cls in type(exc).__mro__
+    )
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; one probe is let through after `reset_timeout`"""
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+    _STATE_NAMES = {CLOSED: "closed", OPEN: "open", HALF_OPEN: "half_open"}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+
+    def _transition(self, state: int):
+        if state != self.state:
+            self.state = state
+            BREAKER_TRANSITIONS.inc(self.name, self._STATE_NAMES[state])
+            logger.warning("Circuit %s is now %s", self.name, self._STATE_NAMES[state])
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probing):
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit open")
+        if self.state == self.HALF_OPEN:
+            self._probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(self.OPEN)
+
+    def release(self):
+        """Give up a half-open probe without an outcome (cancelled, or failed for a local reason)"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+class ResilientCaller:
+    """Runs one provider's calls through the breaker, hedging and retry policy"""
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.cancelled = 0
+
+    @classmethod
+    def from_settings(cls, name: str, settings: Settings, hedge: bool) -> "ResilientCaller":
+        return cls(
+            name,
+            CircuitBreaker(name, settings.breaker_failure_threshold, settings.breaker_reset_timeout),
+            max_attempts=settings.retry_max_attempts,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+            hedge=hedge,
+            hedge_percentile=settings.hedge_percentile,
+            hedge_min_samples=settings.hedge_min_samples
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        """Recent latency percentile after which a second request is sent, or None"""
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))]
+
+    async def call(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await factory() with retries; factory must start a fresh upstream call each time"""
+        self.calls += 1
+        sleep = self.base_delay
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.check()
+            try:
+                result = await self._attempt(factory)
+            except asyncio.CancelledError:
+                # Whoever wanted the result went away (client disconnect or timeout)
+                self.cancelled += 1
+                CANCELLED_UPSTREAM.inc(self.name, "in_flight")
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.release()
+                    raise
+                if isinstance(e, RateLimitedError):
+                    # Being throttled doesn't mean the provider is down
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                if attempt == self.max_attempts:
+                    raise
+                # Decorrelated jitter: next sleep is uniform in [base, 3 * previous]
+                sleep = min(self.max_delay, random.uniform(self.base_delay, sleep * 3))
+                if isinstance(e, RateLimitedError) and e.retry_after:
+                    sleep = max(sleep, e.retry_after)
+                budget = remaining_budget()
+                if budget is not None and sleep >= budget:
+                    raise
+                self.retries += 1
+                RETRIES.inc(self.name)
+                logger.info("Retrying %s in %.2fs (attempt %d failed: %s)", self.name, sleep, attempt, e)
+                await asyncio.sleep(sleep)
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _attempt(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        delay = self.hedge_delay()
+        budget = remaining_budget()
+        if delay is None or (budget is not None and delay >= budget):
+            start = time.monotonic()
+            result = await factory()
+            self._latencies.append(time.monotonic() - start)
+            return result
+
+        start = time.monotonic()
+        primary = asyncio.ensure_future(factory())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                HEDGED_REQUESTS.inc(self.name, "sent")
+                tasks.add(asyncio.ensure_future(factory()))
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._latencies.append(time.monotonic() - start)
+                        if task is not primary:
+                            self.hedge_wins += 1
+                            HEDGED_REQUESTS.inc(self.name, "won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, float]:
+        delay = self.hedge_delay()
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "cancelled": self.cancelled,
+            "hedge_delay_seconds": round(delay, 3) if delay is not None else -1,
+            **{f"breaker_{key}": value for key, value in self.breaker.stats().items()},
+        }
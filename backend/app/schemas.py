@@ -1,6 +1,6 @@
 # backend/app/schemas.py
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -17,6 +17,14 @@ class AnalyzeRequest(BaseModel):
         le=20,
         description="Maximum number of insights"
     )
+    no_cache: bool = Field(
+        default=False,
+        description="Bypass the response cache (like Cache-Control: no-cache)"
+    )
+    include_timings: bool = Field(
+        default=False,
+        description="Return the per-stage timing breakdown in the response"
+    )
 
 
 class Insight(BaseModel):
@@ -32,15 +40,124 @@ class Source(BaseModel):
     snippet: str = Field(..., description="Relevant excerpt")
 
 
+class ThoughtStep(BaseModel):
+    node: str = Field(..., description="Pipeline node (research, analysis, summary)")
+    status: str = Field(..., description="ok, failed, timeout, or resumed from a checkpoint")
+    duration_ms: float = Field(..., ge=0)
+    note: Optional[str] = Field(default=None, description="What the node did, or why it failed")
+
+
 class AnalyzeResponse(BaseModel):
     insights: List[Insight] = Field(default_factory=list)
     sources: List[Source] = Field(default_factory=list)
     total_insights: int = Field(..., ge=0)
     processing_time: float = Field(..., ge=0)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    cached: bool = Field(default=False, description="Served from the response cache")
+    cache_similarity: Optional[float] = Field(
+        default=None,
+        description="Similarity of the cached prompt when served from the semantic cache for a paraphrase"
+    )
+    timings: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Per-stage durations in milliseconds (search, prompt_build, llm, json_extract, validation)"
+    )
+    usage: Optional[Dict[str, int]] = Field(
+        default=None,
+        description="Tokens used to generate this result (prompt_tokens, completion_tokens) and sources that fit the prompt budget"
+    )
+    thought_trace: Optional[List[ThoughtStep]] = Field(
+        default=None,
+        description="Pipeline nodes run for this analysis, in order, with their durations"
+    )
+
+
+class HistoryEntry(BaseModel):
+    id: int = Field(..., description="History id of the analysis")
+    prompt: str
+    created_at: datetime
+    max_results: int
+    processing_time: float
+    insights: List[Insight] = Field(default_factory=list)
+    sources: List[Source] = Field(default_factory=list)
+    timings: Optional[Dict[str, float]] = None
+    usage: Optional[Dict[str, int]] = None
+
+
+class HistoryResponse(BaseModel):
+    items: List[HistoryEntry]
+    next_offset: Optional[int] = Field(default=None, description="Offset of the next page; null on the last page")
+
+
+class InsightSearchHit(BaseModel):
+    analysis_id: int = Field(..., description="History id of the analysis the insight came from")
+    prompt: str
+    created_at: datetime
+    insight: Insight
+
+
+class InsightSearchResponse(BaseModel):
+    items: List[InsightSearchHit]
+    next_offset: Optional[int] = Field(default=None, description="Offset of the next page; null on the last page")
+
+
+class BatchAnalyzeRequest(BaseModel):
+    requests: List[AnalyzeRequest] = Field(
+        ...,
+        min_length=1,
+        description="Analyses to run; identical prompts are run once"
+    )
+    concurrency: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum analyses in flight (capped by the server limit)"
+    )
+    stream: bool = Field(
+        default=False,
+        description="Stream results as NDJSON in completion order instead of one ordered response"
+    )
+
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request list")
+    status: str = Field(..., description="ok or error")
+    result: Optional[AnalyzeResponse] = None
+    error: Optional[str] = None
+
+
+class BatchAnalyzeResponse(BaseModel):
+    results: List[BatchItemResult] = Field(default_factory=list)
+    total: int = Field(..., ge=0)
+    succeeded: int = Field(..., ge=0)
+    failed: int = Field(..., ge=0)
+    processing_time: float = Field(..., ge=0)
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str = Field(..., description="Poll GET /jobs/{job_id} for the result")
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    created_at: datetime
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    queue_wait: Optional[float] = Field(default=None, description="Seconds spent queued before a worker started the job")
+    result: Optional[AnalyzeResponse] = None
+    error: Optional[str] = None
 
 
 class HealthResponse(BaseModel):
     status: str
     version: str
-    environment: str
\ No newline at end of file
+    environment: str
+
+
+class PoolStatsResponse(BaseModel):
+    connections: int = Field(..., ge=0, description="Open connections in the pool")
+    checked_out: int = Field(..., ge=0, description="Connections currently serving a request")
+    idle: int = Field(..., ge=0, description="Keep-alive connections ready for reuse")
+    waiting: int = Field(..., ge=0, description="Requests queued for a free connection")
@@ -0,0 +1,289 @@
+# backend/app/semantic_cache.py
+## Semantic cache for paraphrased prompts ("AI design tools market trends"
+## vs "trends in AI-powered design tools"), which the exact-key response
+## cache misses. Prompts are embedded into sparse unit vectors and matched
+## by cosine similarity through an inverted index. A close enough neighbour
+## reuses the whole AnalyzeResponse; a looser match reuses only its merged
+## search results, skipping the research stage. With the bag-of-words
+## hashing embedder, that example pair scores 0.8: it shares search results,
+## but only near-verbatim rewordings share a whole response.
+
+import logging
+import math
+import re
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .cache import normalize_prompt
+from .config import Settings
+from .metrics import CACHE_REQUESTS, SEMANTIC_SIMILARITY
+from .schemas import AnalyzeResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+# Sparse vector: feature id -> weight, L2-normalized so a dot product is the cosine
+Vector = Dict[int, float]
+
+_WORD = re.compile(r"\w+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how",
+    "i", "in", "into", "is", "it", "its", "me", "my", "of", "on", "or", "our", "should",
+    "that", "the", "their", "this", "to", "we", "what", "which", "who", "why", "with", "you", "your",
+}
+
+
+def _stem(word: str) -> str:
+    """Strip plural endings only, so "trends"/"trend" and "bikes"/"bike" match but "marketing" and "market" don't"""
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "shes", "ches", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+class Embedder(ABC):
+    """Turns a prompt into a sparse unit vector"""
+
+    name: str
+
+    @abstractmethod
+    def embed(self, text: str) -> Vector:
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """Bag of stemmed words hashed into a fixed feature space; local and stateless"""
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = 1 << 20):
+        self.dimensions = dimensions
+
+    def embed(self, text: str) -> Vector:
+        counts: Dict[int, float] = {}
+        for word in _WORD.findall(normalize_prompt(text)):
+            if word in STOPWORDS:
+                continue
+            feature = zlib.crc32(_stem(word).encode()) % self.dimensions
+            counts[feature] = counts.get(feature, 0.0) + 1.0
+        # Sublinear term frequency: repeating a word shouldn't dominate the vector
+        weights = {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {feature: weight / norm for feature, weight in weights.items()} if norm else {}
+
+
+def create_embedder(settings: Settings) -> Embedder:
+    """Build the embedder selected by settings.semantic_cache_embedder"""
+    if settings.semantic_cache_embedder == "hashing":
+        return HashingEmbedder(settings.semantic_cache_dimensions)
+    raise ValueError(f"Unknown semantic cache embedder: {settings.semantic_cache_embedder}")
+
+
+class VectorIndex:
+    """Bounded nearest-neighbour index over sparse vectors.
+
+    Postings map each feature to the entries that contain it, so a query
+    only touches entries sharing at least one feature with it. Least
+    recently used entries are evicted past `max_entries`.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[str, Vector]" = OrderedDict()
+        self._postings: Dict[int, Dict[str, float]] = {}
+        self.evictions = 0
+
+    def add(self, key: str, vector: Vector) -> List[str]:
+        """Insert or replace `key`; return the keys evicted to make room"""
+        self.remove(key)
+        self._vectors[key] = vector
+        for feature, weight in vector.items():
+            self._postings.setdefault(feature, {})[key] = weight
+        evicted = []
+        while len(self._vectors) > self.max_entries:
+            oldest = next(iter(self._vectors))
+            self.remove(oldest)
+            evicted.append(oldest)
+            self.evictions += 1
+        return evicted
+
+    def remove(self, key: str):
+        vector = self._vectors.pop(key, None)
+        if vector is None:
+            return
+        for feature in vector:
+            posting = self._postings.get(feature)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self._postings[feature]
+
+    def touch(self, key: str):
+        if key in self._vectors:
+            self._vectors.move_to_end(key)
+
+    def nearest(self, vector: Vector, limit: int = 5) -> List[Tuple[float, str]]:
+        """Up to `limit` (similarity, key) pairs, most similar first"""
+        scores: Dict[str, float] = {}
+        for feature, weight in vector.items():
+            for key, other in self._postings.get(feature, {}).items():
+                scores[key] = scores.get(key, 0.0) + weight * other
+        # Rounded so that float error doesn't decide matches sitting exactly on a threshold
+        ranked = sorted(((round(score, 6), key) for key, score in scores.items()), reverse=True)
+        return ranked[:limit]
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+
+class SemanticEntry:
+    """What the semantic cache remembers about one prompt"""
+
+    __slots__ = ("key", "expires_at", "num_results", "sources", "max_results", "response")
+
+    def __init__(self, key: str, expires_at: float):
+        self.key = key
+        self.expires_at = expires_at
+        self.num_results = 0
+        self.sources: Optional[List[Dict[str, Any]]] = None
+        self.max_results = 0
+        self.response: Optional[AnalyzeResponse] = None
+
+
+class SemanticCache:
+    """Near-duplicate prompt cache for whole responses and for research results"""
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        max_entries: int,
+        ttl: float,
+        response_threshold: float = 0.9,
+        sources_threshold: float = 0.8
+    ):
+        self.embedder = embedder
+        self.ttl = ttl
+        self.response_threshold = response_threshold
+        self.sources_threshold = sources_threshold
+        self.index = VectorIndex(max_entries)
+        self._entries: Dict[str, SemanticEntry] = {}
+        self.hits = 0
+        self.source_hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "SemanticCache":
+        return cls(
+            create_embedder(settings),
+            settings.semantic_cache_max_entries,
+            settings.semantic_cache_ttl,
+            response_threshold=settings.semantic_cache_threshold,
+            sources_threshold=settings.semantic_cache_sources_threshold
+        )
+
+    def _find(
+        self,
+        prompt: str,
+        threshold: float,
+        lookup: str,
+        usable: Callable[[SemanticEntry], bool]
+    ) -> Optional[Tuple[SemanticEntry, float]]:
+        vector = self.embedder.embed(prompt)
+        now = time.monotonic()
+        best = 0.0
+        found = None
+        expired: Set[str] = set()
+        for similarity, key in self.index.nearest(vector):
+            entry = self._entries[key]
+            if entry.expires_at <= now:
+                expired.add(key)
+                continue
+            best = max(best, similarity)
+            if found is None and similarity >= threshold and usable(entry):
+                found = (entry, similarity)
+        for key in expired:
+            self._drop(key)
+            self.expirations += 1
+        SEMANTIC_SIMILARITY.observe(min(best, 1.0), lookup)
+        if found is not None:
+            self.index.touch(found[0].key)
+        return found
+
+    def get_response(self, prompt: str, max_results: int) -> Optional[Tuple[AnalyzeResponse, float]]:
+        """Cached response for a prompt similar enough to reuse as is, with its similarity"""
+        found = self._find(
+            prompt, self.response_threshold, "response",
+            lambda entry: entry.response is not None and entry.max_results == max_results
+        )
+        if found is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc("semantic", "miss")
+            return None
+        self.hits += 1
+        CACHE_REQUESTS.inc("semantic", "hit")
+        entry, similarity = found
+        return entry.response, similarity
+
+    def get_sources(self, prompt: str, num_results: int) -> Optional[List[Dict[str, Any]]]:
+        """Merged research results of a similar prompt, if it searched at least as deep"""
+        found = self._find(
+            prompt, self.sources_threshold, "sources",
+            lambda entry: entry.sources is not None and entry.num_results >= num_results
+        )
+        if found is None:
+            return None
+        self.source_hits += 1
+        CACHE_REQUESTS.inc("semantic", "sources_hit")
+        return found[0].sources
+
+    def _entry(self, prompt: str) -> SemanticEntry:
+        key = normalize_prompt(prompt)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            entry = self._entries[key] = SemanticEntry(key, time.monotonic() + self.ttl)
+            for evicted in self.index.add(key, self.embedder.embed(prompt)):
+                del self._entries[evicted]
+        else:
+            self.index.touch(key)
+        return entry
+
+    def _drop(self, key: str):
+        self.index.remove(key)
+        self._entries.pop(key, None)
+
+    def add_sources(self, prompt: str, num_results: int, sources: List[Dict[str, Any]]):
+        # Empty results usually mean an upstream problem; don't spread them
+        if not sources:
+            return
+        entry = self._entry(prompt)
+        entry.num_results = num_results
+        entry.sources = sources
+
+    def add_response(self, prompt: str, max_results: int, response: AnalyzeResponse):
+        entry = self._entry(prompt)
+        entry.max_results = max_results
+        entry.response = response
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "entries": len(self.index),
+            "hits": self.hits,
+            "source_hits": self.source_hits,
+            "misses": self.misses,
+            "evictions": self.index.evictions,
+            "expirations": self.expirations,
+        }
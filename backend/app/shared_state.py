@@ -0,0 +1,381 @@
+# backend/app/shared_state.py
+## State shared between worker processes in multi-worker deployments.
+## With STATE_BACKEND=memory (the default) every worker keeps its caches,
+## single-flight and rate limits to itself, as a single process does. The
+## sqlite backend shares them between workers on one host through one
+## file; the redis backend speaks the Redis protocol (RESP) to any
+## compatible server, e.g. bench/resp_server.py as a local stand-in.
+## Backends only store strings with a TTL plus atomic counters and
+## set-if-absent locks; callers serialize their own values.
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackendError(Exception):
+    """The shared state backend could not be reached or rejected a command"""
+
+
+class StateBackend(ABC):
+    """Key/value store with TTLs shared by all workers"""
+
+    name: str
+
+    def __init__(self):
+        self.errors = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        ...
+
+    @abstractmethod
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        """Set key only if it is absent (or expired); True if this call set it"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        """Add to a counter and return the new value; a new counter expires after ttl"""
+
+    async def aclose(self):
+        pass
+
+    def stats(self) -> Dict[str, float]:
+        return {"errors": self.errors}
+
+
+class SQLiteStateBackend(StateBackend):
+    """Shared state in one SQLite file, for several workers on a single host"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit; incr opens its own write transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except sqlite3.Error as e:
+            self.errors += 1
+            raise StateBackendError(str(e)) from e
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM shared_state WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _written(self):
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),))
+
+    def _set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._written()
+
+    def _add(self, key: str, value: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+                " WHERE shared_state.expires_at <= ?",
+                (key, value, now + ttl, now)
+            )
+            self._written()
+            return cursor.rowcount == 1
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def _incr(self, key: str, amount: int, ttl: float) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM shared_state WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[1] <= now:
+                    value, expires_at = amount, now + ttl
+                else:
+                    value, expires_at = int(row[0]) + amount, row[1]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, str(value), expires_at)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._written()
+            return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        return await self._run(self._add, key, value, ttl)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        return await self._run(self._incr, key, amount, ttl)
+
+    async def aclose(self):
+        with self._lock:
+            self._conn.close()
+
+
+def encode_command(*parts: Any) -> bytes:
+    """Encode one command as a RESP array of bulk strings"""
+    out = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP reply; error replies are raised as StateBackendError"""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionResetError("connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise StateBackendError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2].decode()
+    if kind == b"*":
+        count = int(body)
+        # An error element (e.g. in an EXEC reply) is raised after the rest
+        # are read, so the connection stays in sync
+        return None if count < 0 else await read_replies(reader, count)
+    # Out of sync with the server; the connection can't be reused
+    raise ConnectionError(f"unexpected reply: {line[:40]!r}")
+
+
+async def read_replies(reader: asyncio.StreamReader, count: int) -> List[Any]:
+    """Read `count` pipelined replies, raising the first error reply only after all are read"""
+    replies, error = [], None
+    for _ in range(count):
+        try:
+            replies.append(await read_reply(reader))
+        except StateBackendError as e:
+            error = error or e
+            replies.append(None)
+    if error is not None:
+        raise error
+    return replies
+
+
+class RedisStateBackend(StateBackend):
+    """Shared state on a Redis-protocol server through a small pool of connections"""
+
+    name = "redis"
+
+    def __init__(self, url: str, max_connections: int = 10, timeout: float = 2.0):
+        super().__init__()
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            await read_reply(reader)
+        if self.db:
+            writer.write(encode_command("SELECT", self.db))
+            await read_reply(reader)
+        return reader, writer
+
+    async def command(self, *parts: Any) -> Any:
+        return (await self.pipeline(parts))[0]
+
+    async def pipeline(self, *commands: Sequence[Any]) -> List[Any]:
+        """Send several commands in one write and return their replies, in one round trip"""
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                reader, writer = connection
+                writer.write(b"".join(encode_command(*parts) for parts in commands))
+                replies = await asyncio.wait_for(read_replies(reader, len(commands)), self.timeout)
+            except StateBackendError:
+                # An error reply leaves the connection usable
+                self.errors += 1
+                if connection is not None:
+                    self._idle.append(connection)
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                self.errors += 1
+                if connection is not None:
+                    connection[1].close()
+                raise StateBackendError(f"{self.host}:{self.port}: {e!r}") from e
+            except asyncio.CancelledError:
+                # A reply may still be in flight on this connection
+                if connection is not None:
+                    connection[1].close()
+                raise
+            self._idle.append(connection)
+            return replies
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.command("GET", key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.command("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        return await self.command("SET", key, value, "PX", max(1, int(ttl * 1000)), "NX") == "OK"
+
+    async def delete(self, key: str):
+        await self.command("DEL", key)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        # Create the counter with its TTL (INCRBY keeps it) and add to it in one
+        # transaction, so no window is left without an expiry
+        replies = await self.pipeline(
+            ("MULTI",),
+            ("SET", key, 0, "PX", max(1, int(ttl * 1000)), "NX"),
+            ("INCRBY", key, amount),
+            ("EXEC",),
+        )
+        return replies[-1][1]
+
+    async def aclose(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+def create_state_backend(settings: Settings) -> Optional[StateBackend]:
+    """Shared backend selected by settings.state_backend; None keeps state in-process"""
+    if settings.state_backend == "memory":
+        return None
+    if settings.state_backend == "sqlite":
+        return SQLiteStateBackend(settings.state_sqlite_path)
+    if settings.state_backend == "redis":
+        return RedisStateBackend(settings.state_redis_url, settings.state_redis_max_connections)
+    raise ValueError(f"Unknown state backend: {settings.state_backend}")
+
+
+class SharedFlight:
+    """Cross-worker single-flight: one worker runs a key, the others poll for its cached result.
+
+    The running worker holds a lock key that expires after `lock_ttl`, so a
+    crashed worker can't block the key for long. Waiters that see the lock
+    disappear without a result (the analysis failed) run it themselves.
+    """
+
+    def __init__(self, backend: StateBackend, lock_ttl: float, poll_interval: float = 0.1):
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.leaders = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+
+    async def do(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        lookup: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Any:
+        """Run factory() as leader, or wait for the leader's result via lookup()"""
+        lock = f"flight:{key}"
+        try:
+            acquired = await self.backend.add(lock, uuid.uuid4().hex, self.lock_ttl)
+        except StateBackendError as e:
+            logger.warning("Shared single-flight unavailable, running locally: %s", e)
+            acquired = True
+
+        if acquired:
+            self.leaders += 1
+            try:
+                return await factory()
+            finally:
+                try:
+                    await self.backend.delete(lock)
+                except StateBackendError:
+                    pass  # expires on its own
+
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # Lock first: the leader caches its result before releasing it
+                running = await self.backend.get(lock) is not None
+                result = await lookup()
+            except StateBackendError:
+                break
+            if result is not None:
+                self.coalesced += 1
+                return result
+            if not running:
+                break
+        self.fallbacks += 1
+        return await factory()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "fallbacks": self.fallbacks,
+        }
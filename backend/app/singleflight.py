@@ -0,0 +1,107 @@
+# backend/app/singleflight.py
+## Request coalescing: concurrent callers with the same key share one
+## in-flight task instead of each calling the upstream API.
+
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Hashable, Optional
+
+
+def detached(coro: Coroutine) -> asyncio.Task:
+    """Start coro in an empty context, so it doesn't inherit the caller's priority, scoped limits or deadline"""
+    return asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+
+
+async def _call(factory: Callable[[], Awaitable[Any]]) -> Any:
+    return await factory()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one in-flight task.
+
+    The shared task runs detached from the leader's context, since it serves
+    every caller. It is shielded, so a caller that is cancelled (or times
+    out) stops waiting without cancelling the work for the other callers.
+    When the last caller is cancelled (e.g. its client disconnected) nobody
+    is left to read the result, so the task itself is cancelled.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.cancelled = 0
+        self.max_waiters = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def waiters(self, key: Hashable) -> int:
+        """Number of callers currently awaiting the task for key"""
+        return self._waiters.get(key, 0)
+
+    async def do(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Run factory() once per key at a time and return its result to every caller.
+
+        `timeout` bounds how long this caller waits; the shared task keeps
+        running for everybody else when it expires.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            self.leaders += 1
+            task = detached(_call(factory))
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+
+        waiting = self._waiters.get(key, 0) + 1
+        self._waiters[key] = waiting
+        self.max_waiters = max(self.max_waiters, waiting)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.CancelledError:
+            if not task.done():
+                self.abandoned += 1
+                if self._waiters.get(key, 1) == 1:
+                    self.cancelled += 1
+                    task.cancel()
+            raise
+        except asyncio.TimeoutError:
+            if not task.done():
+                self.abandoned += 1
+            raise
+        finally:
+            remaining = self._waiters.get(key, 1) - 1
+            if remaining > 0:
+                self._waiters[key] = remaining
+            else:
+                self._waiters.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "waiters": sum(self._waiters.values()),
+            "max_waiters": self.max_waiters,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,90 @@
+# backend/app/telemetry.py
+## Per-stage timing spans for the analysis pipeline.
+## span() measures a stage with a monotonic clock, records it in the stage
+## histogram and in the current request's timings dict, and, when enabled,
+## exports it as an OpenTelemetry span to a local collector.
+
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from .config import Settings
+from .metrics import STAGE_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+_tracer = None
+
+
+def configure_tracing(settings: Settings):
+    """Set up OTLP span export if OTEL_ENABLED and the SDK is installed"""
+    global _tracer
+    if not settings.otel_enabled:
+        return
+
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but the opentelemetry packages are not installed")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.otel_service_name}))
+    provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.otel_endpoint, insecure=True))
+    )
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("marketing-agent")
+    logger.info("Exporting traces to %s", settings.otel_endpoint)
+
+
+def shutdown_tracing():
+    global _tracer
+    if _tracer is None:
+        return
+    from opentelemetry import trace
+
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+    _tracer = None
+
+
+def start_timings() -> Dict[str, float]:
+    """Begin collecting stage timings (milliseconds) for the current task"""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(stage: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """Time one pipeline stage; repeated stages within a request accumulate.
+
+    Durations go to `timings` if given, else to the dict from start_timings().
+    Pass it explicitly where the stage spans several tasks (e.g. streaming).
+    """
+    with ExitStack() as stack:
+        if _tracer is not None:
+            # A span crossing tasks can't be attached as "current" context
+            if timings is None:
+                stack.enter_context(_tracer.start_as_current_span(stage))
+            else:
+                stack.callback(_tracer.start_span(stage).end)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, stage)
+            if timings is None:
+                timings = _timings.get()
+            if timings is not None:
+                timings[stage] = round(timings.get(stage, 0.0) + elapsed * 1000, 3)
@@ -0,0 +1,391 @@
+# backend/bench/analyze_bench.py
+## Benchmark / load-test harness for the /analyze pipeline.
+## Drives the FastAPI app against the mock search and LLM providers, either
+## in-process through the ASGI interface or over a real uvicorn server, and
+## writes latency percentiles, throughput, event-loop lag and per-stage
+## timings to JSON so runs can be diffed between commits.
+## --record captures real SerpAPI/Gemini exchanges into a cassette and
+## --replay runs against it offline (app/replay.py); replay with the same
+## --prompts/--unique-prompts and --max-results the cassette was recorded with.
+##
+## Usage (from backend/):
+##   python -m bench.analyze_bench --mode inprocess --concurrency 1 8 32 --requests 200
+##   python -m bench.analyze_bench --mode uvicorn --output bench.json
+##   python -m bench.analyze_bench --compare baseline.json --output current.json
+##   python -m bench.analyze_bench --record cassettes/bench.jsonl.gz --prompts prompts.txt --concurrency 1 --requests 50
+##   python -m bench.analyze_bench --replay cassettes/bench.jsonl.gz --prompts prompts.txt --requests 500
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Offline, deterministic configuration for every run. Caches are off unless
+# --with-cache is given so each request exercises the full pipeline.
+BENCH_ENV = {
+    "SEARCH_PROVIDER": "mock",
+    "LLM_PROVIDER": "mock",
+    "CACHE_ENABLED": "false",
+    "SEARCH_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "HISTORY_ENABLED": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max of a list of milliseconds"""
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "max": round(max(values), 3) if values else 0.0,
+        "count": len(values),
+    }
+
+
+class LoopLagMonitor:
+    """Measure event-loop lag as the overshoot of a periodic short sleep"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append((loop.time() - start - self.interval) * 1000)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class StageTimer:
+    """Wrap agent stage methods in-process and record how long each takes"""
+
+    STAGES = {
+        "research": "research",
+        "search": "search_web",
+        "prompt_build": "build_prompt",
+        "llm": "generate_text",
+        "parse": "parse_llm_output",
+        "insight_validation": "to_insight",
+        "source_validation": "to_sources",
+    }
+
+    def __init__(self, agent):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        for stage, attr in self.STAGES.items():
+            original = getattr(agent, attr, None)
+            if original is not None:
+                setattr(agent, attr, self._wrap(stage, original))
+
+    def _wrap(self, stage: str, fn: Callable):
+        samples = self.samples[stage]
+        if asyncio.iscoroutinefunction(fn):
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    samples.append((time.perf_counter() - start) * 1000)
+            return timed_async
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples.append((time.perf_counter() - start) * 1000)
+        return timed
+
+    def reset(self):
+        for values in self.samples.values():
+            values.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: summarize(values) for stage, values in self.samples.items() if values}
+
+
+async def run_load(
+    send: Callable[[int], Awaitable[int]],
+    concurrency: int,
+    total: int,
+) -> Dict[str, Any]:
+    """Issue `total` requests with at most `concurrency` in flight"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = defaultdict(int)
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                status = await send(i)
+            except Exception:
+                status = 0
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] += 1
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    await monitor.stop()
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "wall_seconds": round(wall, 3),
+        "rps": round(total / wall, 2) if wall else 0.0,
+        "errors": total - statuses.get(200, 0),
+        "status_counts": {str(k): v for k, v in sorted(statuses.items())},
+        "latency_ms": summarize(latencies),
+        "loop_lag_ms": summarize(monitor.samples),
+    }
+
+
+def request_body(i: int, args: argparse.Namespace) -> Dict[str, Any]:
+    # Distinct prompts unless measuring the cache with a small prompt pool
+    prompt_id = i % args.unique_prompts if args.unique_prompts else i
+    if args.prompt_list:
+        return {"prompt": args.prompt_list[prompt_id % len(args.prompt_list)], "max_results": args.max_results}
+    return {"prompt": f"Benchmark marketing prompt {prompt_id}", "max_results": args.max_results}
+
+
+def load_prompts(path: str) -> List[str]:
+    """One prompt per non-empty line"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def bench_inprocess(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+    from app import main
+
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        timer = StageTimer(await main.get_agent())
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            async def send(i: int) -> int:
+                response = await client.post("/analyze", json=request_body(i, args))
+                return response.status_code
+
+            await run_load(send, 1, min(args.warmup, args.requests))
+            for concurrency in args.concurrency:
+                timer.reset()
+                result = await run_load(send, concurrency, args.requests)
+                result["mode"] = "inprocess"
+                result["stages_ms"] = timer.summary()
+                results.append(result)
+                print_result(result)
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(client, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not become ready")
+
+
+async def bench_uvicorn(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+
+    port = _free_port()
+    env = {**os.environ, **BENCH_ENV}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+            await _wait_until_up(client)
+
+            async def send(i: int) -> int:
+                response = await client.post("/analyze", json=request_body(i, args))
+                return response.status_code
+
+            await run_load(send, 1, min(args.warmup, args.requests))
+            for concurrency in args.concurrency:
+                result = await run_load(send, concurrency, args.requests)
+                result["mode"] = "uvicorn"
+                # Loop lag here is the client's loop; stages are not visible across processes
+                results.append(result)
+                print_result(result)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return results
+
+
+def print_result(result: Dict[str, Any]):
+    latency = result["latency_ms"]
+    print(
+        f"[{result['mode']}] c={result['concurrency']:<4} rps={result['rps']:<8} "
+        f"p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms p99={latency['p99']:.1f}ms "
+        f"errors={result['errors']} loop_lag_p99={result['loop_lag_ms']['p99']:.2f}ms"
+    )
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    """Print relative change of rps and latency percentiles against a baseline run"""
+    previous = {(r["mode"], r["concurrency"]): r for r in baseline.get("results", [])}
+    print("\nComparison against baseline (positive = slower / less throughput):")
+    for result in current["results"]:
+        base = previous.get((result["mode"], result["concurrency"]))
+        if base is None:
+            continue
+        line = [f"[{result['mode']}] c={result['concurrency']:<4}"]
+        if base["rps"]:
+            line.append(f"rps {(base['rps'] - result['rps']) / base['rps'] * 100:+.1f}%")
+        for pct in ("p50", "p95", "p99"):
+            old = base["latency_ms"][pct]
+            if old:
+                line.append(f"{pct} {(result['latency_ms'][pct] - old) / old * 100:+.1f}%")
+        print("  ".join(line))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the /analyze pipeline against mock or recorded providers")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "both"], default="inprocess")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--unique-prompts", type=int, default=0, help="cycle through N prompts (0 = all distinct)")
+    parser.add_argument("--with-cache", action="store_true", help="keep the response and search caches on")
+    parser.add_argument("--search-latency-ms", type=float, default=50.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--prompts", help="file with one prompt per line to cycle through instead of synthetic prompts")
+    upstream = parser.add_mutually_exclusive_group()
+    upstream.add_argument("--record", metavar="CASSETTE",
+                          help="call the configured live providers and record every exchange to CASSETTE")
+    upstream.add_argument("--replay", metavar="CASSETTE", help="serve search and LLM calls from a recorded CASSETTE")
+    parser.add_argument("--replay-latency-scale", type=float, default=1.0,
+                        help="multiply recorded latencies on replay (0 = no latency)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    args.prompt_list = load_prompts(args.prompts) if args.prompts else []
+
+    BENCH_ENV.update({
+        "MOCK_SEARCH_LATENCY_MS": str(args.search_latency_ms),
+        "MOCK_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "MOCK_LATENCY_DISTRIBUTION": args.latency_distribution,
+        "MOCK_SEARCH_FAILURE_RATE": str(args.failure_rate),
+        "MOCK_LLM_FAILURE_RATE": str(args.failure_rate),
+        "LLM_MAX_CONCURRENCY": str(max(args.concurrency)),
+    })
+    if args.with_cache:
+        BENCH_ENV.update({"CACHE_ENABLED": "true", "SEARCH_CACHE_ENABLED": "true", "SEMANTIC_CACHE_ENABLED": "true"})
+    if args.record:
+        # Record from the providers configured in the environment / .env, not the mocks
+        del BENCH_ENV["SEARCH_PROVIDER"], BENCH_ENV["LLM_PROVIDER"]
+        BENCH_ENV.update({"UPSTREAM_MODE": "record", "CASSETTE_PATH": os.path.abspath(args.record)})
+    if args.replay:
+        if not os.path.exists(args.replay):
+            sys.exit(f"cassette not found: {args.replay}")
+        BENCH_ENV.update({
+            "UPSTREAM_MODE": "replay",
+            "CASSETTE_PATH": os.path.abspath(args.replay),
+            "REPLAY_LATENCY_SCALE": str(args.replay_latency_scale),
+        })
+    # Settings are read at import time, so configure before importing the app
+    os.environ.update(BENCH_ENV)
+    sys.path.insert(0, BACKEND_DIR)
+
+    results: List[Dict[str, Any]] = []
+    if args.mode in ("inprocess", "both"):
+        results += asyncio.run(bench_inprocess(args))
+    if args.mode in ("uvicorn", "both"):
+        results += asyncio.run(bench_uvicorn(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "prompt_list")},
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# backend/bench/import_budget.py
+## Cold-start check: import app.main in a fresh interpreter under
+## `-X importtime` and fail if it takes longer than the budget or pulls in
+## modules that must stay off the import path (the Gemini SDK and its gRPC
+## stack are loaded by the lifespan warm-up, not at import).
+##
+## Usage (from backend/):
+##   python -m bench.import_budget
+##   python -m bench.import_budget --budget-ms 1500 --top 15
+## tests/test_import_budget.py enforces it in CI, relative to the web stack.
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules app.main must not import eagerly
+DEFAULT_FORBIDDEN = ["google.generativeai", "grpc"]
+
+
+def profile_import(module: str) -> Tuple[float, Dict[str, int]]:
+    """Return (wall-clock ms, cumulative µs per module) for importing `module`"""
+    # No API keys: the app must import (and start) without them
+    env = {k: v for k, v in os.environ.items() if not k.endswith("API_KEY")}
+    env["LOG_LEVEL"] = "WARNING"
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - start) * 1000)"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    cumulative: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            total = int(fields[1])
+        except ValueError:
+            continue  # header row
+        cumulative[fields[2].strip()] = total
+    return float(completed.stdout.strip().splitlines()[-1]), cumulative
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Enforce an import-time budget for the API module")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=3000.0, help="wall-clock budget for the import")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN, help="modules that must not be imported")
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest top-level imports")
+    args = parser.parse_args(argv)
+
+    elapsed_ms, cumulative = profile_import(args.module)
+
+    print(f"import {args.module}: {elapsed_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    roots = {name: total for name, total in cumulative.items() if "." not in name}
+    for name, total in sorted(roots.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {total / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if elapsed_ms > args.budget_ms:
+        failures.append(f"import took {elapsed_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    for forbidden in args.forbid:
+        loaded = [name for name in cumulative if name == forbidden or name.startswith(forbidden + ".")]
+        if loaded:
+            failures.append(f"{forbidden} is imported at import time ({len(loaded)} modules)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
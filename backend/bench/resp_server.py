@@ -0,0 +1,189 @@
+# backend/bench/resp_server.py
+## Minimal in-memory Redis-protocol (RESP) server, a local stand-in for
+## Redis when running several workers with STATE_BACKEND=redis on a
+## machine without one. Supports only the commands RedisStateBackend
+## uses, including MULTI/EXEC transactions (plus PING, DBSIZE and FLUSHALL);
+## state is lost on exit.
+##
+## Usage (from backend/):
+##   python -m bench.resp_server --port 6379
+##   STATE_BACKEND=redis STATE_REDIS_URL=redis://127.0.0.1:6379/0 gunicorn -c gunicorn.conf.py app.main:app
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class Store:
+    """Key -> (value, expires_at or None)"""
+
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def set(self, key: bytes, value: bytes, ttl_ms: Optional[int]):
+        self._data[key] = (value, time.monotonic() + ttl_ms / 1000 if ttl_ms else None)
+
+    def expire(self, key: bytes, ttl_ms: int) -> bool:
+        value = self.get(key)
+        if value is None:
+            return False
+        self._data[key] = (value, time.monotonic() + ttl_ms / 1000)
+        return True
+
+    def incr(self, key: bytes, amount: int) -> int:
+        """Add to an integer value, keeping its TTL; raises ValueError for non-integers"""
+        current = self.get(key)
+        value = int(current or 0) + amount
+        expires_at = self._data[key][1] if current is not None else None
+        self._data[key] = (str(value).encode(), expires_at)
+        return value
+
+    def clear(self):
+        self._data.clear()
+
+    def delete(self, key: bytes) -> bool:
+        return self._data.pop(key, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _error(message: str) -> bytes:
+    return f"-ERR {message}\r\n".encode()
+
+
+def execute(store: Store, args: List[bytes]) -> bytes:
+    """Run one command and return the encoded reply"""
+    command = args[0].upper()
+    if command == b"PING":
+        return b"+PONG\r\n"
+    if command in (b"AUTH", b"SELECT"):
+        return b"+OK\r\n"
+    if command == b"GET" and len(args) == 2:
+        return _bulk(store.get(args[1]))
+    if command == b"SET" and len(args) >= 3:
+        ttl_ms, only_new = None, False
+        options = [arg.upper() for arg in args[3:]]
+        i = 0
+        while i < len(options):
+            if options[i] in (b"PX", b"EX") and i + 1 < len(options):
+                ttl_ms = int(options[i + 1]) * (1000 if options[i] == b"EX" else 1)
+                i += 2
+            elif options[i] == b"NX":
+                only_new = True
+                i += 1
+            else:
+                return _error("syntax error")
+        if only_new and store.get(args[1]) is not None:
+            return _bulk(None)
+        store.set(args[1], args[2], ttl_ms)
+        return b"+OK\r\n"
+    if command == b"DEL" and len(args) >= 2:
+        return b":%d\r\n" % sum(store.delete(key) for key in args[1:])
+    if command in (b"INCR", b"INCRBY") and len(args) == (2 if command == b"INCR" else 3):
+        try:
+            value = store.incr(args[1], int(args[2]) if command == b"INCRBY" else 1)
+        except ValueError:
+            return _error("value is not an integer or out of range")
+        return b":%d\r\n" % value
+    if command in (b"PEXPIRE", b"EXPIRE") and len(args) == 3:
+        ttl_ms = int(args[2]) * (1000 if command == b"EXPIRE" else 1)
+        return b":%d\r\n" % store.expire(args[1], ttl_ms)
+    if command == b"DBSIZE":
+        return b":%d\r\n" % len(store)
+    if command == b"FLUSHALL":
+        store.clear()
+        return b"+OK\r\n"
+    return _error(f"unknown command or wrong number of arguments for '{command.decode(errors='replace')}'")
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    """Read one RESP array of bulk strings; None at EOF"""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet)
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def serve(host: str, port: int):
+    store = Store()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Commands queued since MULTI on this connection, or None outside a transaction
+        queued: Optional[List[List[bytes]]] = None
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                command = args[0].upper()
+                if command == b"MULTI":
+                    if queued is None:
+                        reply, queued = b"+OK\r\n", []
+                    else:
+                        reply = _error("MULTI calls can not be nested")
+                elif command == b"EXEC":
+                    if queued is None:
+                        reply = _error("EXEC without MULTI")
+                    else:
+                        # Nothing else runs between the queued commands
+                        reply = b"*%d\r\n" % len(queued) + b"".join(execute(store, queued_args) for queued_args in queued)
+                        queued = None
+                elif command == b"DISCARD":
+                    reply = _error("DISCARD without MULTI") if queued is None else b"+OK\r\n"
+                    queued = None
+                elif queued is not None:
+                    queued.append(args)
+                    reply = b"+QUEUED\r\n"
+                else:
+                    reply = execute(store, args)
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"RESP stand-in listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol stand-in for local multi-worker runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
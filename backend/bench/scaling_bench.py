@@ -0,0 +1,148 @@
+# backend/bench/scaling_bench.py
+## Multi-worker scaling benchmark.
+## Starts the API with 1, 2, 4... workers (gunicorn with gunicorn.conf.py,
+## or uvicorn --workers), drives the same closed-loop /analyze load at each
+## size and reports throughput, latency and the speedup over one worker.
+## Mock provider latency defaults to a few milliseconds so the run is
+## bound by per-request CPU (routing, validation, prompt building, JSON),
+## which is what extra workers add; with the default 1.5 s mock LLM a
+## single event loop already overlaps all the waiting.
+##
+## Usage (from backend/):
+##   python -m bench.scaling_bench --workers 1 2 4 --concurrency 64 --requests 2000
+##   python -m bench.scaling_bench --state redis --server uvicorn --output scaling.json
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .analyze_bench import BACKEND_DIR, BENCH_ENV, _free_port, _wait_until_up, git_commit, run_load
+
+
+def start_server(args: argparse.Namespace, workers: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    if args.server == "gunicorn":
+        command = ["gunicorn", "-c", "gunicorn.conf.py", "app.main:app"]
+        env = {**env, "WEB_CONCURRENCY": str(workers), "PORT": str(port)}
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning"
+        ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+
+
+async def bench_workers(args: argparse.Namespace, workers: int, env: Dict[str, str]) -> Dict[str, Any]:
+    import httpx
+
+    port = _free_port()
+    server = start_server(args, workers, port, env)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+            await _wait_until_up(client)
+            # Every worker warms up on its own; give the last ones a moment
+            await asyncio.sleep(1.0 + 0.25 * workers)
+
+            async def send(i: int) -> int:
+                body = {"prompt": f"Scaling benchmark prompt {workers}-{i}", "max_results": 5}
+                response = await client.post("/analyze", json=body)
+                return response.status_code
+
+            await run_load(send, args.concurrency, args.warmup)
+            result = await run_load(send, args.concurrency, args.requests)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    result["workers"] = workers
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Measure /analyze throughput as workers are added")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--state", choices=["memory", "sqlite", "redis"], default="sqlite",
+                        help="shared state backend; redis starts the local RESP stand-in unless --redis-url is given")
+    parser.add_argument("--redis-url", help="use this Redis-protocol server instead of the stand-in")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per worker count")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--search-latency-ms", type=float, default=2.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    env = {
+        **os.environ,
+        **BENCH_ENV,
+        "MOCK_SEARCH_LATENCY_MS": str(args.search_latency_ms),
+        "MOCK_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "MOCK_LATENCY_DISTRIBUTION": "fixed",
+        "LLM_MAX_CONCURRENCY": str(args.concurrency),
+        "STATE_BACKEND": args.state,
+    }
+
+    stand_in = None
+    if args.state == "sqlite":
+        env["STATE_SQLITE_PATH"] = os.path.join(BACKEND_DIR, f"scaling_bench_state_{os.getpid()}.db")
+    if args.state == "redis":
+        if args.redis_url:
+            env["STATE_REDIS_URL"] = args.redis_url
+        else:
+            redis_port = _free_port()
+            stand_in = subprocess.Popen(
+                [sys.executable, "-m", "bench.resp_server", "--port", str(redis_port)],
+                cwd=BACKEND_DIR,
+                stdout=subprocess.DEVNULL,
+            )
+            env["STATE_REDIS_URL"] = f"redis://127.0.0.1:{redis_port}/0"
+
+    results: List[Dict[str, Any]] = []
+    try:
+        for workers in args.workers:
+            result = asyncio.run(bench_workers(args, workers, env))
+            baseline = results[0] if results else result
+            result["speedup"] = round(result["rps"] / baseline["rps"] * baseline["workers"], 2) if baseline["rps"] else 0.0
+            result["efficiency"] = round(result["speedup"] / workers, 2)
+            results.append(result)
+            latency = result["latency_ms"]
+            print(
+                f"workers={workers:<3} rps={result['rps']:<9} speedup={result['speedup']:<5} "
+                f"efficiency={result['efficiency']:<5} p50={latency['p50']:.1f}ms p99={latency['p99']:.1f}ms "
+                f"errors={result['errors']}"
+            )
+    finally:
+        if stand_in is not None:
+            stand_in.terminate()
+            stand_in.wait(timeout=10)
+        if args.state == "sqlite":
+            for suffix in ("", "-wal", "-shm"):
+                path = env["STATE_SQLITE_PATH"] + suffix
+                if os.path.exists(path):
+                    os.remove(path)
+
+    if os.cpu_count() and max(args.workers) > os.cpu_count():
+        print(f"note: only {os.cpu_count()} CPU(s) available; workers beyond that can't add throughput")
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "cpu_count": os.cpu_count(),
+                "config": {k: v for k, v in vars(args).items() if k != "output"},
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
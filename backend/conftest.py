@@ -0,0 +1,7 @@
+# backend/conftest.py
+## pytest setup for the tests/ directory (run `python -m pytest` from backend/).
+## Being at the top of backend/ puts it on sys.path, so tests import `app`
+## and `bench` directly.
+
+# A manual script that calls the real Gemini API, not a test
+collect_ignore = ["test_gemini.py"]
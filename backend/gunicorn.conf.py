@@ -0,0 +1,37 @@
+# backend/gunicorn.conf.py
+## Multi-worker deployment: gunicorn supervising uvicorn workers, one per core
+## by default. Each worker runs the lifespan warm-up and builds its own agent,
+## so set STATE_BACKEND=sqlite (one host) or STATE_BACKEND=redis to share
+## caches, single-flight and upstream rate limits between workers; with the
+## default memory backend each worker enforces the full rate limits on its own.
+## Job status is shared through the backend too; with the memory backend
+## /jobs is disabled. The semantic cache and /metrics stay per worker.
+##
+## Usage (from backend/):
+##   STATE_BACKEND=sqlite gunicorn -c gunicorn.conf.py app.main:app
+##   WEB_CONCURRENCY=8 STATE_BACKEND=redis STATE_REDIS_URL=redis://cache:6379/0 gunicorn -c gunicorn.conf.py app.main:app
+
+import multiprocessing
+import os
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Workers inherit the environment; app settings read the worker count as WEB_WORKERS
+os.environ["WEB_WORKERS"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Longer than REQUEST_TIMEOUT so gunicorn never kills a worker mid-analysis
+timeout = int(os.getenv("REQUEST_TIMEOUT", "60")) + 30
+graceful_timeout = 30
+keepalive = 5
+
+# Workers build their agent after forking; nothing to share by preloading
+preload_app = False
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+accesslog = None
@@ -0,0 +1,38 @@
+# backend/tests/test_import_budget.py
+## Import-time budget for app.main, measured in fresh interpreters.
+## An absolute budget flakes with machine speed, so app.main is compared
+## against importing just the web stack it is built on: what the app adds
+## on top (its own modules plus anything it pulls in eagerly) must stay
+## under OWN_BUDGET_MS.
+
+import os
+
+from bench.import_budget import DEFAULT_FORBIDDEN, profile_import
+
+
+# The third-party modules app.main can't avoid importing
+FRAMEWORK = "fastapi, fastapi.responses, httpx, pydantic_settings"
+
+# What app.main may add on top; about 150 ms when this was written
+OWN_BUDGET_MS = float(os.getenv("IMPORT_OWN_BUDGET_MS", "600"))
+
+
+def best_of(module: str, runs: int = 2):
+    """Fastest of a few cold imports, to damp scheduler noise"""
+    return min((profile_import(module) for _ in range(runs)), key=lambda result: result[0])
+
+
+def test_app_import_stays_within_budget():
+    framework_ms, _ = best_of(FRAMEWORK)
+    app_ms, _ = best_of("app.main")
+    assert app_ms - framework_ms <= OWN_BUDGET_MS, (
+        f"import app.main took {app_ms:.0f} ms, {app_ms - framework_ms:.0f} ms over the "
+        f"{framework_ms:.0f} ms web stack (budget {OWN_BUDGET_MS:.0f} ms)"
+    )
+
+
+def test_app_import_skips_heavy_sdks():
+    _, cumulative = profile_import("app.main")
+    for forbidden in DEFAULT_FORBIDDEN:
+        loaded = [name for name in cumulative if name == forbidden or name.startswith(forbidden + ".")]
+        assert not loaded, f"{forbidden} is imported by app.main ({len(loaded)} modules)"
@@ -0,0 +1,39 @@
+# backend/tests/test_jobs.py
+## /jobs exists for analyses longer than an interactive request allows:
+## only jobs_timeout may cut a job off, not the pipeline's node timeouts.
+
+import asyncio
+
+from app.agent import MarketingAgent
+from app.config import get_settings
+from app.jobs import JobQueue
+from app.providers import LatencyModel, MockLLMProvider, MockSearchProvider
+from app.schemas import AnalyzeRequest
+
+
+# Past the 45 s analysis-node timeout the pipeline used to apply to every caller
+SLOW_LLM_MS = 46000
+
+
+async def run_slow_job():
+    agent = MarketingAgent(
+        search_provider=MockSearchProvider(LatencyModel(5, "fixed")),
+        llm_provider=MockLLMProvider(LatencyModel(SLOW_LLM_MS, "fixed"))
+    )
+    queue = JobQueue(agent, get_settings())
+    queue.start()
+    try:
+        job = await queue.submit(AnalyzeRequest(prompt="Slow analysis of B2B SaaS pricing pages"))
+        while (await queue.get(job.id)).status in ("queued", "running"):
+            await asyncio.sleep(0.5)
+        return await queue.get(job.id)
+    finally:
+        await queue.stop()
+        await agent.aclose()
+
+
+def test_job_longer_than_node_timeouts_succeeds():
+    status = asyncio.run(run_slow_job())
+    assert status.status == "succeeded", status.error
+    assert status.result.insights
+    assert status.queue_wait is not None
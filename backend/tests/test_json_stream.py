@@ -0,0 +1,78 @@
+# backend/tests/test_json_stream.py
+## Parsing Gemini output into insights: prose, fences and stray braces around
+## the JSON, truncated output, and several objects in one response.
+
+import json
+
+from app.json_stream import InsightStreamParser, iter_json_objects, parse_insights_document
+
+
+DOCUMENT = json.dumps({
+    "insights": [
+        {"title": "Pricing {tiers}", "description": "Say \"freemium\""},
+        {"title": "Channels", "description": "Short video"},
+    ],
+    "summary": "done",
+})
+TITLES = ["Pricing {tiers}", "Channels"]
+
+
+def titles(document):
+    return [insight["title"] for insight in document["insights"]]
+
+
+def test_bare_document():
+    parsed, outcome = parse_insights_document(DOCUMENT)
+    assert outcome == "complete"
+    assert titles(parsed) == TITLES
+
+
+def test_prose_before_and_after():
+    parsed, outcome = parse_insights_document(f"Here is the analysis:\n{DOCUMENT}\nLet me know if you need more.")
+    assert outcome == "complete"
+    assert titles(parsed) == TITLES
+
+
+def test_code_fence():
+    parsed, outcome = parse_insights_document(f"```json\n{DOCUMENT}\n```")
+    assert outcome == "complete"
+    assert titles(parsed) == TITLES
+
+
+def test_unbalanced_brace_in_prose():
+    parsed, outcome = parse_insights_document("Note {see below\n" + DOCUMENT)
+    assert outcome == "complete"
+    assert titles(parsed) == TITLES
+
+
+def test_truncated_output_keeps_complete_insights():
+    parsed, outcome = parse_insights_document("Note {see below\n" + DOCUMENT[:DOCUMENT.index("Short")])
+    assert outcome == "recovered"
+    assert titles(parsed) == TITLES[:1]
+
+
+def test_unparseable_output_fails():
+    assert parse_insights_document("I could not find any sources.") == (None, "failed")
+
+
+def test_multiple_objects():
+    text = '{"note": "draft"}\n' + DOCUMENT + '\n{"insights": []}'
+    assert list(iter_json_objects(text)) == ['{"note": "draft"}', DOCUMENT, '{"insights": []}']
+    parsed, outcome = parse_insights_document(text)
+    assert outcome == "complete"
+    assert titles(parsed) == TITLES
+
+
+def test_stream_only_captures_the_insights_array():
+    text = '{"sources": [{"title": "not an insight"}], "insights": [{"title": "a", "tags": [{"x": 1}]}]}'
+    assert InsightStreamParser().feed(text) == [{"title": "a", "tags": [{"x": 1}]}]
+
+
+def test_stream_in_small_chunks():
+    text = "Note {see below\n```json\n" + DOCUMENT + "\n```"
+    parser = InsightStreamParser()
+    completed = []
+    for i in range(0, len(text), 7):
+        completed.extend(parser.feed(text[i:i + 7]))
+    assert [insight["title"] for insight in completed] == TITLES
+    assert parser.emitted == 2
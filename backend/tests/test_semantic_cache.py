@@ -0,0 +1,55 @@
+# backend/tests/test_semantic_cache.py
+## The semantic cache at its default thresholds: rewordings reuse the whole
+## response, close paraphrases only the search results, and prompts about a
+## different subject neither.
+
+from app.config import Settings
+from app.schemas import AnalyzeResponse
+from app.semantic_cache import SemanticCache
+
+
+CACHED_PROMPT = "AI design tools market trends"
+
+
+def make_cache(prompt: str = CACHED_PROMPT) -> SemanticCache:
+    cache = SemanticCache.from_settings(Settings())
+    cache.add_response(prompt, 5, AnalyzeResponse(total_insights=0, processing_time=1.0))
+    cache.add_sources(prompt, 5, [{"title": "t", "url": "https://example.com", "snippet": "s"}])
+    return cache
+
+
+def test_rewording_reuses_the_response():
+    hit = make_cache().get_response("What are the market trends for AI design tools?", 5)
+    assert hit is not None
+    assert hit[1] >= Settings().semantic_cache_threshold
+
+
+def test_plurals_match():
+    assert make_cache("electric bike market").get_response("electric bikes market", 5) is not None
+
+
+def test_paraphrase_reuses_only_the_sources():
+    cache = make_cache()
+    assert cache.get_response("trends in AI-powered design tools", 5) is None
+    assert cache.get_sources("trends in AI-powered design tools", 5) is not None
+
+
+def test_response_needs_the_same_max_results():
+    assert make_cache().get_response("What are the market trends for AI design tools?", 10) is None
+
+
+def test_different_subject_misses():
+    cache = make_cache()
+    assert cache.get_response("AI design tools pricing", 5) is None
+    assert cache.get_sources("AI design tools pricing", 5) is None
+    assert cache.get_response("AI writing tools market trends", 5) is None
+
+
+def test_market_and_marketing_differ():
+    cache = make_cache("electric bike market")
+    assert cache.get_response("electric bike marketing", 5) is None
+    assert cache.get_sources("electric bike marketing", 5) is None
+
+
+def test_dropping_a_subject_word_misses_the_response():
+    assert make_cache("market trends in coffee").get_response("coffee trends", 5) is None
@@ -2,6 +2,7 @@
 
 import React, { useState, useEffect } from 'react';
 import { Play, RefreshCw, CheckCircle, Loader, AlertCircle, Wifi, WifiOff, TrendingUp, Globe } from 'lucide-react';
+import { analyzeMarketingStream } from './services/api';
 
 const MarketingAgentSimulator = () => {
   const [input, setInput] = useState("What are the best marketing channels for B2B SaaS companies?");
@@ -117,45 +118,24 @@ const MarketingAgentSimulator = () => {
       // Start node animation
       const progressPromise = progressNodes();
 
-      // Make actual API call
-      const response = await fetch('https://marketing-mba-backend.onrender.com/analyze', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          prompt: input,
-          max_results: maxResults
-        })
+      // Stream the analysis: render sources and insights as they arrive
+      let partial = { insights: [], sources: [] };
+      const data = await analyzeMarketingStream(input, maxResults, {
+        onSources: (sources) => {
+          partial = { ...partial, sources };
+          setFinalOutput(buildOutput(partial));
+        },
+        onInsight: (insight) => {
+          partial = { ...partial, insights: [...partial.insights, insight] };
+          setFinalOutput(buildOutput(partial));
+        },
       });
 
-      if (!response.ok) {
-        throw new Error(`API error: ${response.status}`);
-      }
-
-      const data = await response.json();
-
       // Wait for animation to complete
       await progressPromise;
 
       // Format output
-      setFinalOutput({
-        insights: data.insights || [],
-        sources: data.sources || [],
-        thought_trace: {
-          research_phase: `Retrieved ${data.sources?.length || 0} sources`,
-          analysis_phase: `Generated ${data.insights?.length || 0} insights`,
-          synthesis_phase: `Average confidence: ${calculateAvgConfidence(data.insights)}`,
-          quality_metrics: {
-            total_insights: data.total_insights,
-            processing_time: data.processing_time,
-            timestamp: data.timestamp
-          }
-        },
-        metadata: {
-          execution_time_ms: data.processing_time * 1000,
-          nodes_executed: nodes.length,
-          timestamp: data.timestamp || new Date().toISOString()
-        }
-      });
+      setFinalOutput(buildOutput(data));
 
       setCurrentNode(null);
     } catch (error) {
@@ -171,6 +151,27 @@ const MarketingAgentSimulator = () => {
     }
   };
 
+  const buildOutput = (data) => ({
+    insights: data.insights || [],
+    sources: data.sources || [],
+    thought_trace: {
+      research_phase: `Retrieved ${data.sources?.length || 0} sources`,
+      analysis_phase: `Generated ${data.insights?.length || 0} insights`,
+      synthesis_phase: `Average confidence: ${calculateAvgConfidence(data.insights)}`,
+      pipeline_nodes: data.thought_trace || [],
+      quality_metrics: {
+        total_insights: data.total_insights ?? data.insights?.length ?? 0,
+        processing_time: data.processing_time,
+        timestamp: data.timestamp
+      }
+    },
+    metadata: {
+      execution_time_ms: (data.processing_time || 0) * 1000,
+      nodes_executed: nodes.length,
+      timestamp: data.timestamp || new Date().toISOString()
+    }
+  });
+
   const calculateAvgConfidence = (insights) => {
     if (!insights || insights.length === 0) return '0.00';
     const avg = insights.reduce((sum, i) => sum + (i.confidence || 0), 0) / insights.length;
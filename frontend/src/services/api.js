@@ -1,7 +1,7 @@
 import axios from 'axios';
 
 
-const API_BASE_URL = import.meta.env.VITE_API_URL || process.env.REACT_APP_API_URL;
+const API_BASE_URL = import.meta.env.VITE_API_URL || process.env.REACT_APP_API_URL || 'https://marketing-mba-backend.onrender.com';
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -27,6 +27,65 @@ export const analyzeMarketing = async (prompt, maxResults = 5) => {
   }
 };
 
+// Parse one Server-Sent Events message into { event, data }
+const parseSSE = (message) => {
+  let event = 'message';
+  const dataLines = [];
+  for (const line of message.split('\n')) {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+  }
+  return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+};
+
+// Stream /analyze/stream: sources arrive first, then insights one by one.
+// Resolves with the accumulated result once the "done" event arrives.
+export const analyzeMarketingStream = async (prompt, maxResults = 5, { onSources, onInsight, signal } = {}) => {
+  const response = await fetch(`${API_BASE_URL}/analyze/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ prompt, max_results: maxResults }),
+    signal,
+  });
+
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  const result = { insights: [], sources: [] };
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const messages = buffer.split('\n\n');
+    buffer = messages.pop();
+
+    for (const message of messages) {
+      if (!message.trim()) continue;
+      const { event, data } = parseSSE(message);
+
+      if (event === 'sources') {
+        result.sources = data;
+        onSources?.(data);
+      } else if (event === 'insight') {
+        result.insights = [...result.insights, data];
+        onInsight?.(data);
+      } else if (event === 'done') {
+        Object.assign(result, data);
+      } else if (event === 'error') {
+        throw new Error(data?.detail || 'Failed to analyze marketing query');
+      }
+    }
+  }
+
+  return result;
+};
+
 export const checkHealth = async () => {
   try {
     const response = await api.get('/health');